@@ -4,12 +4,16 @@
 Data pre-processing for FIFA dataset
 """
 
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.getcwd()))
+sys.path.append(BASE_DIR)
+sys.path.append('TCFPACN')
+
 import numpy as np
 import pandas as pd
 import random
-import math
-#import FBTP.players as players
-from collections import OrderedDict
+import warnings
+from FBTP import players, modules
 
 # URLs dos arquivos CSV no GitHub
 url_goalkeepers = 'https://raw.githubusercontent.com/ShenbaoYu/TCFPACN/main/Data/FIFA/Goalkeeper.csv'
@@ -24,34 +28,22 @@ url_forward = 'https://raw.githubusercontent.com/ShenbaoYu/TCFPACN/main/Data/FIF
 Lê um arquivo contendo critérios de avaliação de jogadores
 (por exemplo, importância de habilidades específicas para cada posição).
 Normaliza os valores dos critérios para que a soma total seja 1.
+A leitura é comum ao PESpre (<modules.read_criteria>).
 """
-def read_criteria(path, criteria_file):
-    criteria = {}
-    with open(path + criteria_file, 'r') as cf:
-        while True:
-            line = cf.readline()
-            if not line:
-                break
-            name = line.split(":")[0]
-            value = line.split(":")[1][:-1]
-
-            criteria[name] = int(value)
-
-    criteria = normalize(criteria)
-
-    return criteria
+read_criteria = modules.read_criteria
 
 """
 Lê informações sobre goleiros de um arquivo CSV.
 Cria objetos Goalkeeper para cada goleiro, preenchendo seus atributos (ID, rating, salário, habilidades).
 O salário é calculado com base no rating do goleiro usando uma fórmula exponencial.
+Goleiros sem rating ou com alguma habilidade em branco são descartados, com um aviso (<drop_missing>).
 """
-def get_goalkeepers(url_goalkeepers):#(path, file_name):
+def get_goalkeepers(file_name):
     """
     Obtém informações sobre todos os goleiros.
 
     Args:
-        url: URL do arquivo CSV contendo os dados dos goleiros.
+        file_name: Caminho (ou URL) do arquivo CSV contendo os dados dos goleiros.
 
     Returns:
         Uma lista de objetos Goalkeeper.
@@ -59,27 +51,63 @@ def get_goalkeepers(url_goalkeepers):#(path, file_name):
     """
 
     goal_keepers = [] # get all goalkeepers
+    abilities = ['gk_diving', 'gk_handling', 'gk_kicking', 'gk_reflexes', 'gk_speed', 'gk_positioning']
+
+    # only the needed columns, as float so that blank cells are read as NaN
+    _meta = pd.read_csv(file_name, delimiter=',', usecols=['sofifa_id', 'overall'] + abilities,
+                        dtype={col: np.float64 for col in ['sofifa_id', 'overall'] + abilities})
+    _meta = drop_missing(_meta, ['sofifa_id', 'overall'] + abilities, file_name)
 
-    # tratamento de erro caso falhe a leitura do arquivo CSV
-    try:
-        _meta = pd.read_csv(url_goalkeepers, delimiter=',')  # Lê o CSV uma única vez
-    except Exception as e:
-        print(f"Erro ao ler o arquivo CSV: {e}")
-        return goal_keepers  # Retorna uma lista vazia em caso de erro
+    ratings = _meta['overall'].to_numpy()
+    # salaries = _meta['value_eur']  # salary (Euro)
+    salaries = 0.0006375 * np.exp(0.1029*ratings)  # calculate salary
+    skills = _meta[abilities].to_numpy()
 
-    for idx, _data in _meta.iterrows(): # Use o DataFrame lido no try-except
-        gk_id = _data['sofifa_id']
+    for gk_id, rating, salary, ability in zip(_meta['sofifa_id'].tolist(), ratings.tolist(),
+                                              salaries.tolist(), skills.tolist()):
         gk = players.Goalkeeper(gk_id)
-        gk.rating = _data['overall']  # the rating
-        # gk.salary = _data['value_eur']  # salary (Euro)
-        gk.salary = 0.0006375 * math.exp(0.1029*gk.rating)  # calculate salary
-        gk.ability = _data.loc[['gk_diving', 'gk_handling', 'gk_kicking',
-                                'gk_reflexes', 'gk_speed', 'gk_positioning']
-                              ].tolist()
+        gk.rating = rating  # the rating
+        gk.salary = salary
+        gk.ability = ability
         goal_keepers.append(gk)
 
     return goal_keepers
 
+"""
+- Lê de um arquivo CSV somente as colunas usadas (ID, rating, clube, nacionalidade,
+    posição e as habilidades, colunas 44 a 72), com tipos explícitos, em arrays colunares.
+- DIV (Back ou Forward) é deduzido do nome do arquivo, para a escolha das posições (<get_positions>).
+- Clube, nacionalidade e posição são codificados como inteiros; as tabelas de códigos
+    guardam os nomes na ordem em que aparecem.
+- Retorna um dicionário:
+--> ability_names: Nomes das habilidades.
+--> id, rating: Arrays com o ID e o rating de cada jogador.
+--> position, club, nationality: Arrays de códigos, com os nomes em position_names, club_names, nationality_names.
+--> abilities: Matriz (jogadores x habilidades).
+- Jogadores sem ID, sem rating ou com alguma habilidade em branco são descartados, com um aviso (<drop_missing>).
+"""
+def read_columns(file_name):
+    DIV = 'Back' if 'Back' in file_name else 'Forward'  # Determina DIV com base no nome do arquivo
+
+    attrs = list(pd.read_csv(file_name, delimiter=',', nrows=0).columns[44:73])
+    _meta = pd.read_csv(file_name, delimiter=',',
+                        usecols=['sofifa_id', 'overall', 'club', 'nationality', 'team_position'] + attrs,
+                        dtype=dict({'club': object, 'nationality': object, 'team_position': object},
+                                   **{col: np.float64 for col in ['sofifa_id', 'overall'] + attrs}))
+    _meta = drop_missing(_meta, ['sofifa_id', 'overall'] + attrs, file_name)
+
+    columns = {'ability_names': attrs,
+               'id': _meta['sofifa_id'].to_numpy(),
+               'rating': _meta['overall'].to_numpy(),
+               'abilities': _meta[attrs].to_numpy()}  # the ability block, in the order of the file
+    for name, values in (('position', get_positions(_meta['team_position'], DIV)),
+                         ('club', _meta['club']), ('nationality', _meta['nationality'])):
+        codes, names = pd.factorize(values, use_na_sentinel=False)
+        columns[name] = codes.astype(np.int64)
+        columns[name + '_names'] = list(names)
+
+    return columns
+
 """
 - Lê informações sobre jogadores de um arquivo CSV, diferenciando entre
 jogadores de defesa (Back) e de ataque/meio-campo (Forward).
@@ -89,64 +117,39 @@ jogadores de defesa (Back) e de ataque/meio-campo (Forward).
 --> Posições dos jogadores.
 --> Ratings dos jogadores.
 --> IDs dos jogadores.
-- Preenche esses dicionários com os dados lidos do arquivo.
+- Preenche esses dicionários a partir das colunas lidas por <read_columns>.
 - Para jogadores sem posição definida, atribui uma posição aleatória da
 lista de posições possíveis para sua categoria (Back ou Forward).
 """
-def read_info(url): #file_name):
+def read_info(file_name):
     """
     Lê informações sobre jogadores de um arquivo CSV.
+    Os dicionários são montados a partir de <read_columns> por dataset.PlayerTable.info.
 
     Args:
-        url: URL do arquivo CSV contendo os dados dos jogadores.
+        file_name: Caminho (ou URL) do arquivo CSV contendo os dados dos jogadores.
 
     Returns:
         Uma tupla contendo: ability_name_id, player_attributes, player_abilities_name,
         player_position, player_rating, player_no_id.
     """
-    DIV = 'Back' if 'Back' in url else 'Forward'  # Determina DIV com base na URL
-    #DIV = file_name.split('.')[0]
-
-    player_attributes = {}  # playbers attributes, including club and nationality
-    player_abilities_name = OrderedDict()  # personal abilities
-    player_position = {}  # players' position {id:position}
-    player_rating = {}  # players' rating {id:rating}
-    # player_salary = {}  # players' salary {id:salary}
-
-    try:
-        _meta = pd.read_csv(url, delimiter=',')
-    except Exception as e:
-        print(f"Erro ao ler o arquivo CSV: {e}")
-        return {}, {}, {}, {}, {}, {}  # Retorna dicionários vazios em caso de erro
-
-    attrs = [column for column in _meta][44:73]
-    ability_name_id = dict(zip(attrs, [i for i in range(len(attrs))]))
-    for att in attrs:
-        player_abilities_name[att] = {}
-
-    player_no_id = {}  # player's number : id
-    for idx, _data in _meta.iterrows():
-        player_no_id[idx] = _data['sofifa_id']  # player's id
-        player_position[idx] = get_position(_data, DIV)  # player's position
-        player_rating[idx] = _data['overall']  # player's rating
-        # if _data['value_eur'] != 0:
-        #     player_salary[idx] = _data['value_eur']  # salary (Euro)
-        # else:
-        #      player_salary[idx] = cal_player_salary(_data['overall'])
-
-
-        # player's attributes, including club and nationality
-        player_attributes[idx] = [_data['club'], _data['nationality']]
-        abis = dict(_data.iloc[44:73])
-        for abi, val in abis.items():
-            player_abilities_name[abi][idx] = val
-
-    return ability_name_id,       \
-           player_attributes,     \
-           player_abilities_name, \
-           player_position,       \
-           player_rating,         \
-           player_no_id
+
+    from FBTP import dataset  # imported here: dataset imports this module
+    return dataset.read_info(read_columns(file_name))
+
+
+"""
+Descarta as linhas com algum valor em branco (NaN) nas colunas numéricas cols, com um aviso,
+e converte essas colunas para inteiros (lidas como float, pois inteiros não representam NaN).
+"""
+def drop_missing(_meta, cols, file_name):
+    missing = _meta[cols].isna().any(axis=1)
+    if missing.any():
+        warnings.warn("%s: skipping %d rows with blank values in %s"
+                      % (file_name, missing.sum(), [col for col in cols if _meta[col].isna().any()]))
+        _meta = _meta[~missing].reset_index(drop=True)
+
+    return _meta.astype({col: np.int64 for col in cols})
 
 
 """
@@ -170,12 +173,21 @@ def get_position(data, div):
             return data['team_position']
 
 """
-- Função auxiliar usada por read_criteria para normalizar os valores de um dicionário.
-- Divide cada valor pela soma total dos valores, garantindo que a soma dos valores normalizados seja 1.
+Versão de <get_position> para uma coluna inteira de posições (pandas Series).
+As posições inválidas são sorteadas na ordem das linhas, como em <get_position>.
 """
-def normalize(dict_type):
-    total = sum(v for v in dict_type.values())
-    tmp = {}
-    for key, value in dict_type.items():
-        tmp[key] = value / total
-    return tmp
\ No newline at end of file
+def get_positions(positions, div):
+    if div == 'Back':
+        valid = ['LWB','RWB','LB','LCB','CB','RCB','RB']
+    elif div == 'Forward':
+        valid = ['LS','LF','CF','RF','RS','ST','LW','SS','RW',  # Forward
+                 'LAM','CAM','RAM','CM','LM','LCM','RCM','RM','LDM','CDM','RDM']
+
+    positions = positions.to_numpy(dtype=object).copy()
+    invalid = ~np.isin(positions, valid)
+    positions[invalid] = [random.choice(valid) for _ in range(invalid.sum())]  # choose a position randomly
+
+    return positions
+
+# Normaliza os valores de um dicionário para que somem 1 (comum ao PESpre).
+normalize = modules.normalize
\ No newline at end of file
@@ -21,10 +21,9 @@ sys.path.append('TCFPACN')
 # que é específica para trabalhar com arquivos Excel.
 import openpyxl
 import math
-from FBTP import players
-from collections import OrderedDict
-
-import requests
+import warnings
+import numpy as np
+from FBTP import players, modules
 
 urls = [
     'https://github.com/ShenbaoYu/TCFPACN/raw/main/Data/PES/Goalkeeper.xlsx',
@@ -32,57 +31,112 @@ urls = [
     'https://github.com/ShenbaoYu/TCFPACN/raw/main/Data/PES/Forward.xlsx',
 ]  # Substitua pelos links corretos
 
-for url in urls:
-    filename = url.split('/')[-1]  # Extrai o nome do arquivo da URL
-    response = requests.get(url)
-    with open(filename, 'wb') as f:
-        f.write(response.content)
-
-
 """
-Idêntica à função do código FIFApre, mas para o conjunto de dados PES.
-Lê os critérios de avaliação de um arquivo de texto e normaliza seus valores.
+Baixa as planilhas do PES (urls) para o diretório path.
+Não é mais executada ao importar o módulo, que é um dos leitores de <dataset.DatasetAdapter>.
 """
-def read_criteria(path, criteria_file):
-    criteria = {}
-    with open(path + criteria_file, 'r') as cf:
-        while True:
-            line = cf.readline()
-            if not line:
-                break
-            name = line.split(":")[0]
-            value = line.split(":")[1][:-1]
+def download(path=''):
+    import requests  # only needed to download the data
 
-            criteria[name] = int(value)
+    for url in urls:
+        filename = url.split('/')[-1]  # Extrai o nome do arquivo da URL
+        response = requests.get(url)
+        with open(path + filename, 'wb') as f:
+            f.write(response.content)
 
-    criteria = normalize(criteria)
 
-    return criteria
+# Lê os critérios de avaliação de um arquivo de texto e normaliza seus valores (comum ao FIFApre).
+read_criteria = modules.read_criteria
 
 """
 - Lê informações sobre goleiros de um arquivo XLSX.
 - Cria objetos Goalkeeper para cada goleiro, preenchendo seus atributos (ID, rating, salário, habilidades).
 - O salário é calculado da mesma forma que no código 3, com base no rating do goleiro.
+- A planilha é lida em modo somente leitura, linha a linha (sem carregar o workbook inteiro).
+- Linhas com o rating ou alguma habilidade em branco são ignoradas, com um aviso.
 """
 def get_goalkeepers(file_name):
 
-    wb = openpyxl.load_workbook(file_name)
+    wb = openpyxl.load_workbook(file_name, read_only=True, data_only=True)
     #wb = openpyxl.load_workbook(url)   # open source
     ws = wb["GoalKeeper"]
 
     goal_keepers = []
-    for row in range(2, ws.max_row+1):
-        gk_id = ws.cell(row=row, column=1).value
-        gk = players.Goalkeeper(gk_id)
-        gk.rating = ws.cell(row=row, column=10).value  # the rating of goalkeeprs
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        if row[0] is None:
+            continue  # empty row
+        if missing_cells(row, [9], 28, len(row), "GoalKeeper"):
+            continue
+        gk = players.Goalkeeper(row[0])
+        gk.rating = row[9]  # the rating of goalkeeprs
         gk.salary = 0.0006375 * math.exp(0.1029*gk.rating)  # calculate salary
-
-        for column in range(29, ws.max_column+1): # read skills
-            gk.ability.append(ws.cell(row=row, column=column).value)
+        gk.ability = list(row[28:])  # read skills
         goal_keepers.append(gk)
 
+    wb.close()
+
     return goal_keepers
 
+"""
+- Lê a planilha "Players" de um arquivo XLSX em modo somente leitura, linha a linha,
+    gravando cada linha diretamente em arrays colunares pré-alocados (a memória não cresce
+    com objetos por célula).
+- Clube, nacionalidade e posição são codificados como inteiros; as tabelas de códigos
+    guardam os nomes na ordem em que aparecem.
+- Retorna um dicionário:
+--> ability_names: Nomes das 18 habilidades (colunas 11 a 28).
+--> id, rating: Arrays com o ID e o rating de cada jogador.
+--> position, club, nationality: Arrays de códigos, com os nomes em position_names, club_names, nationality_names.
+--> abilities: Matriz (jogadores x habilidades).
+- Linhas com o rating ou alguma habilidade em branco são ignoradas, com um aviso
+    (as colunas são inteiras e não têm como representar a célula vazia).
+"""
+def read_columns(file_name):
+
+    wb = openpyxl.load_workbook(file_name, read_only=True, data_only=True)
+    ws = wb["Players"]
+    rows = ws.iter_rows(values_only=True)
+
+    header = next(rows)
+    ability_names = list(header[10:28])  # target ability
+
+    capacity = max((ws.max_row or 0) - 1, 1)
+    columns = {'id': np.zeros(capacity, dtype=np.int64),
+               'rating': np.zeros(capacity, dtype=np.int64),
+               'position': np.zeros(capacity, dtype=np.int64),
+               'club': np.zeros(capacity, dtype=np.int64),
+               'nationality': np.zeros(capacity, dtype=np.int64),
+               'abilities': np.zeros((capacity, len(ability_names)), dtype=np.int64)}
+    codes = {'position': {}, 'club': {}, 'nationality': {}}  # name : code
+
+    no = 0  # number of player
+    for row in rows:
+        if row[0] is None:
+            continue  # empty row
+        if missing_cells(row, [9], 10, 28, "Players"):
+            continue
+        if no == capacity:  # the sheet dimension was not reliable
+            capacity *= 2
+            for name, column in columns.items():
+                columns[name] = np.resize(column, (capacity,) + column.shape[1:])
+
+        columns['id'][no] = row[0]  # player's ID
+        columns['position'][no] = codes['position'].setdefault(row[1], len(codes['position']))
+        columns['rating'][no] = row[9]
+        columns['club'][no] = codes['club'].setdefault(row[3], len(codes['club']))
+        columns['nationality'][no] = codes['nationality'].setdefault(row[4], len(codes['nationality']))
+        columns['abilities'][no] = row[10:28]
+        no += 1
+
+    wb.close()
+
+    columns = {name: column[:no] for name, column in columns.items()}
+    columns['ability_names'] = ability_names
+    for name, table in codes.items():
+        columns[name + '_names'] = list(table)
+
+    return columns
+
 """
 - Lê informações sobre jogadores (exceto goleiros) de um arquivo XLSX.
 - Cria dicionários para armazenar:
@@ -91,7 +145,7 @@ def get_goalkeepers(file_name):
 --> Posições dos jogadores.
 --> Ratings dos jogadores.
 --> IDs dos jogadores.
-- Preenche esses dicionários com os dados lidos do arquivo XLSX.
+- Preenche esses dicionários a partir das colunas lidas por <read_columns>, com dataset.PlayerTable.info.
 
  OBS: Não possui a lógica para lidar com jogadores sem posição definida,
  como no <FIFApre>. Isso pode ser uma diferença nos dados do PES ou uma escolha de implementação.
@@ -99,72 +153,18 @@ def get_goalkeepers(file_name):
 """
 def read_info(file_name):
 
-    ability_name_id = {}  # ability {name:id}
-    player_attributes = {}  # atributos do jogador, incluindo clube e nacionalidade
-    player_abilities_name = OrderedDict()  # habilidades pessoais
-    player_position = {}  # posição do jogador {id:position}
-    player_rating = {}  # avaliação do jogador {id:rating}
-
-    wb = openpyxl.load_workbook(file_name)
-    #wb = openpyxl.load_workbook(path + file_name)
-    ws = wb["Players"]
-
-    player_no_id = {}  # player's number : id
-    no = 0  # number of player
-    ability_id = 0  # número da habilidade
-
-    for row in range(1, ws.max_row + 1):
-        if row == 1:
-            for column in range(11, 29):  # target ability
-                player_abilities_name[ws.cell(row=row, column=column).value] = {}
-
-            for ability_name in player_abilities_name.keys():
-                ability_name_id[ability_name] = ability_id
-                ability_id += 1
-        else:
-            player_id = ws.cell(row=row, column=1).value  # get player's ID
-            player_no_id[no] = player_id
-            position = ws.cell(row=row, column=2).value  # get player's position
-            player_position[no] = position
-            rating = ws.cell(row=row, column=10).value  # get player's rating
-            player_rating[no] = rating
-
-            # player's attributes, including club and nationality
-            team_name = ws.cell(row=row, column=4).value  # player's team name
-            nationality = ws.cell(row=row, column=5).value  # player's nationality
-            player_attributes[no] = []
-            player_attributes[no].append(team_name)
-            player_attributes[no].append(nationality)
-
-            # player's abilities
-            _ = []
-            for column in range(11, 29):  # range of target abilities
-                _.append(ws.cell(row=row, column=column).value)
-            c = 0
-            for ability in player_abilities_name:
-                player_abilities_name[ability][no] = _[c]
-                c += 1
-
-            no += 1
-
-    return ability_name_id,       \
-           player_attributes,     \
-           player_abilities_name, \
-           player_position,       \
-           player_rating,         \
-           player_no_id
-
-"""
-- Função auxiliar usada por read_criteria para normalizar os valores de um dicionário.
-- Divide cada valor pela soma total dos valores, garantindo que a soma dos valores normalizados seja 1.
-"""
-def normalize(dict_type):
-    total = sum(v for v in dict_type.values())
-    tmp = {}
-    for key, value in dict_type.items():
-        tmp[key] = value / total
-    return tmp
-
-goalkeepers = get_goalkeepers('Goalkeeper.xlsx')
-ability_name_id, player_attributes, player_abilities_name, player_position, player_rating, player_no_id = read_info('Back.xlsx')
-ability_name_id, player_attributes, player_abilities_name, player_position, player_rating, player_no_id = read_info('Forward.xlsx')
\ No newline at end of file
+    from FBTP import dataset  # imported here: dataset imports this module
+    return dataset.read_info(read_columns(file_name))
+
+# Avisa e retorna True se a linha tem em branco alguma das colunas cols ou das colunas first:last.
+def missing_cells(row, cols, first, last, sheet):
+    blank = [col for col in cols if row[col] is None] + \
+            [col for col in range(first, min(last, len(row))) if row[col] is None]
+    if len(row) < last:
+        blank += list(range(len(row), last))
+    if blank:
+        warnings.warn("%s: skipping the player %s, the columns %s are blank" % (sheet, row[0], blank))
+    return bool(blank)
+
+# Normaliza os valores de um dicionário para que somem 1 (comum ao FIFApre).
+normalize = modules.normalize
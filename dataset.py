@@ -0,0 +1,340 @@
+# coding=utf-8
+
+"""
+Compiled datasets: the parsed spreadsheets/CSVs stored as columnar .npy arrays
+
+The PES and FIFA readers (PESpre, FIFApre) are plugged in behind a
+DatasetAdapter, which returns the players of each file as a PlayerTable.
+A dataset directory holds one sub-directory per file (Goalkeeper, Back, Forward)
+with one .npy file per column and a names.npz with the name tables. It is
+written once from the output of PESpre/FIFApre and loaded with
+np.load(mmap_mode='r'), so later runs neither parse Excel nor unpickle dicts.
+
+The other preprocessing stages (the sparse similarity and the networks) are
+kept as .npz arrays in a content-addressed StageCache.
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.getcwd()))
+sys.path.append(BASE_DIR)
+sys.path.append('TCFPACN')
+
+from FBTP import players, greedy, PESpre, FIFApre
+
+from collections import OrderedDict
+import hashlib
+import inspect
+import logging
+import numpy as np
+import scipy.sparse as sp
+
+
+NETWORKS = ('Back', 'Forward')
+NAMES = ('ability_names', 'position_names', 'club_names', 'nationality_names')  # the tables in names.npz
+READERS = {'PES': PESpre, 'FIFA': FIFApre}  # datasource : reader module
+GRAPHS = {graph.__name__: graph for graph in (players.ArrayGraph, players.ClassGraph)}  # the networks in the StageCache
+STAGE_VERSION = 1  # bump to invalidate every cached stage, e.g. when the artifact format changes
+
+
+class PlayerTable:
+    """
+    The players of one file (Back or Forward) as a struct of arrays
+
+    One NumPy column per field, indexed by the player's number: id, rating,
+    salary, the codes of position, club and nationality and the ability matrix
+    (players x abilities). The code tables (position_names, club_names,
+    nationality_names) and ability_names hold the names.
+    """
+
+    def __init__(self, columns):
+        self.id = columns['id']
+        self.rating = columns['rating']
+        self.salary = columns['salary'] if 'salary' in columns else \
+            greedy.cal_player_salary(np.arange(len(columns['rating'])), columns['rating'])
+        self.position = columns['position']
+        self.club = columns['club']
+        self.nationality = columns['nationality']
+        self.abilities = columns['abilities']
+        self.ability_names = list(columns['ability_names'])
+        self.position_names = list(columns['position_names'])
+        self.club_names = list(columns['club_names'])
+        self.nationality_names = list(columns['nationality_names'])
+
+    def __len__(self):
+        return len(self.id)
+
+    def columns(self):
+        """
+        The columns and the code tables, in the format of save_columns
+        """
+        return {name: getattr(self, name) for name in ('id', 'rating', 'salary', 'position', 'club', 'nationality',
+                                                        'abilities') + NAMES}
+
+    @property
+    def ability_name_id(self):
+        return {name: ability_id for ability_id, name in enumerate(self.ability_names)}
+
+    def position_labels(self):
+        """
+        The position of each player (array of names)
+        """
+        return np.asarray(self.position_names, dtype=object)[np.asarray(self.position)]
+
+    def attributes(self):
+        """
+        The [club, nationality] of each player, as used by the similarity
+        """
+        clubs = np.asarray(self.club_names, dtype=object)[np.asarray(self.club)].tolist()
+        nationalities = np.asarray(self.nationality_names, dtype=object)[np.asarray(self.nationality)].tolist()
+        return [list(attribute) for attribute in zip(clubs, nationalities)]
+
+    def ability_avg(self):
+        """
+        The mean of each ability over the players, as modules.cal_ability_avg
+        """
+        means = np.asarray(self.abilities).sum(axis=0) / len(self)
+        return OrderedDict(zip(self.ability_names, means.tolist()))
+
+    def player_no_id(self):
+        return dict(enumerate(np.asarray(self.id).tolist()))
+
+    def info(self):
+        """
+        The six dicts of PESpre.read_info/FIFApre.read_info built from the columns
+        """
+        player_position = dict(enumerate(self.position_labels().tolist()))
+        player_rating = dict(enumerate(np.asarray(self.rating).tolist()))
+        player_attributes = dict(enumerate(self.attributes()))
+
+        player_abilities_name = OrderedDict()
+        abilities = np.asarray(self.abilities)
+        for ability_id, ability in enumerate(self.ability_names):
+            player_abilities_name[ability] = dict(enumerate(abilities[:, ability_id].tolist()))
+
+        return self.ability_name_id,   \
+               player_attributes,     \
+               player_abilities_name, \
+               player_position,       \
+               player_rating,         \
+               self.player_no_id()
+
+
+# A tabela de jogadores de um dicionário de colunas (ou a própria tabela).
+def as_player_table(columns):
+    if isinstance(columns, PlayerTable):
+        return columns
+    return PlayerTable(columns)
+
+
+class DatasetAdapter:
+    """
+    One interface over the dataset readers
+
+    A reader is a module with read_columns(file), get_goalkeepers(file) and
+    read_criteria(path, file) (PESpre, FIFApre); every file is named relative
+    to file_path and the players come back as a PlayerTable.
+    """
+
+    def __init__(self, datasource, file_path, reader=None):
+        self.datasource = datasource
+        self.file_path = file_path
+        self.reader = reader if reader is not None else READERS[datasource]
+
+    def criteria(self, criteria_file):
+        return self.reader.read_criteria(self.file_path, criteria_file)
+
+    def goalkeepers(self, file_name):
+        return self.reader.get_goalkeepers(self.file_path + file_name)
+
+    def players(self, file_name):
+        return PlayerTable(self.reader.read_columns(self.file_path + file_name))
+
+    def functions(self):
+        """
+        The functions that read the raw files, for the keys of the StageCache
+        """
+        return [compile_dataset, greedy.cal_player_salary, players.Goalkeeper, self.reader]
+
+    def compile(self, directory, files):
+        compile_dataset(directory, self, files)
+
+
+"""
+- Compila um conjunto de dados (PES ou FIFA) em um diretório de arrays.
+- adapter: O DatasetAdapter do conjunto de dados; os jogadores de defesa e de
+    ataque/meio-campo são lidos como PlayerTable e os goleiros como players.Goalkeeper.
+- files: Dicionário {Goalkeeper/Back/Forward: nome do arquivo}, relativo ao file_path do adapter.
+- O salário de cada jogador (<greedy.cal_player_salary>) é calculado e guardado junto.
+"""
+def compile_dataset(directory, adapter, files):
+
+    gks = adapter.goalkeepers(files['Goalkeeper'])
+    rating = np.array([gk.get_rating() for gk in gks], dtype=np.int64)
+    save_columns(os.path.join(directory, 'Goalkeeper'),
+                 {'id': np.array([gk.get_id() for gk in gks], dtype=np.int64),
+                  'rating': rating,
+                  'salary': np.array([gk.get_salary() for gk in gks]),
+                  'abilities': np.array([gk.get_ability() for gk in gks], dtype=np.int64).reshape(len(gks), -1)})
+
+    for network_name in NETWORKS:
+        save_columns(os.path.join(directory, network_name), adapter.players(files[network_name]).columns())
+
+
+# Grava as colunas (arrays) em arquivos .npy e as tabelas de nomes em names.npz.
+def save_columns(directory, columns):
+    os.makedirs(directory, exist_ok=True)
+    names = {}
+    for name, column in columns.items():
+        if name in NAMES:
+            names[name] = np.array(['' if value is None or value != value else str(value) for value in column])  # '' for missing
+        else:
+            np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(column))
+    np.savez(os.path.join(directory, 'names.npz'), **names)
+
+
+# Carrega as colunas gravadas por <save_columns>; com mmap os arrays são mapeados, não lidos.
+def load_columns(directory, mmap=True):
+    columns = {}
+    for file_name in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(file_name)
+        if ext == '.npy':
+            columns[name] = np.load(os.path.join(directory, file_name), mmap_mode='r' if mmap else None)
+    with np.load(os.path.join(directory, 'names.npz')) as names:
+        for name in names.files:
+            columns[name] = [value if value != '' else float('nan') for value in names[name].tolist()]
+    return columns
+
+
+# Indica se o diretório já contém um conjunto de dados compilado.
+def is_compiled(directory):
+    return all(os.path.exists(os.path.join(directory, name, 'names.npz')) for name in ('Goalkeeper',) + NETWORKS)
+
+
+"""
+- Carrega um conjunto de dados compilado.
+- Retorna um dicionário {Goalkeeper: colunas, Back/Forward: PlayerTable}.
+"""
+def load_dataset(directory, mmap=True):
+    data = {'Goalkeeper': load_columns(os.path.join(directory, 'Goalkeeper'), mmap)}
+    for network_name in NETWORKS:
+        data[network_name] = PlayerTable(load_columns(os.path.join(directory, network_name), mmap))
+    return data
+
+
+# Os goleiros (players.Goalkeeper) a partir das colunas compiladas.
+def goalkeepers(columns):
+    gks = []
+    for gk_id, rating, salary, ability in zip(columns['id'].tolist(), columns['rating'].tolist(),
+                                              columns['salary'].tolist(), columns['abilities'].tolist()):
+        gk = players.Goalkeeper(gk_id)
+        gk.rating = rating
+        gk.salary = salary
+        gk.ability = ability
+        gks.append(gk)
+    return gks
+
+
+"""
+- As informações dos jogadores, no formato de <PESpre.read_info> e <FIFApre.read_info>,
+    a partir das colunas compiladas de uma rede (Back ou Forward) ou da sua PlayerTable.
+"""
+def read_info(columns):
+    return as_player_table(columns).info()
+
+
+class StageCache:
+    """
+    Content-addressed cache of the preprocessing stages
+
+    An artifact is stored under the hash of STAGE_VERSION, the stage name, the
+    source code of the modules the stage functions come from (so their callees
+    are covered too), the stage parameters and the keys of its inputs (the
+    digests of the raw files or the keys of upstream artifacts), so a stage runs
+    again only when one of them changes and its dependants follow.
+
+    The artifacts are arrays, never pickles: a sparse matrix is saved with
+    scipy.sparse.save_npz and a network (GRAPHS) as the .npz of its arrays(),
+    rebuilt with from_arrays.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def file_digest(path):
+        """
+        The SHA-256 digest of the contents of a file
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def key(self, stage, functions, inputs=(), params=()):
+        """
+        The key of a stage: hash of its name, code, input keys and parameters
+
+        functions are functions, classes or modules; the whole source of their modules is hashed.
+        """
+        digest = hashlib.sha256(("%d:%s" % (STAGE_VERSION, stage)).encode())
+        sources = OrderedDict()
+        for function in functions:
+            module = inspect.getmodule(function)
+            sources.setdefault(module.__name__ if module is not None else repr(function), module or function)
+        for source in sources.values():
+            try:
+                code = inspect.getsource(source)
+            except (OSError, TypeError):
+                code = source.__code__.co_code.hex()
+            digest.update(code.encode())
+        for key in inputs:
+            digest.update(str(key).encode())
+        digest.update(repr(params).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def has(self, key):
+        return os.path.exists(self.path(key) + '.npz')
+
+    def load(self, key):
+        path = self.path(key) + '.npz'
+        logging.info("load the artifact %s" % key)
+        with np.load(path, allow_pickle=False) as arrays:
+            if 'graph' not in arrays.files:  # a sparse matrix
+                return sp.load_npz(path)
+            graph = GRAPHS[str(arrays['graph'])]
+            position_names = arrays['position_names']
+            return graph.from_arrays({name: arrays[name] for name in arrays.files
+                                      if name not in ('graph', 'position_names')}, position_names)
+
+    def save(self, key, artifact):
+        if not sp.issparse(artifact) and type(artifact).__name__ not in GRAPHS:
+            raise TypeError("the StageCache stores sparse matrices and networks, not %s" % type(artifact).__name__)
+        path = self.path(key) + '.npz'
+        with open(path + '.tmp', 'wb') as file:
+            if sp.issparse(artifact):
+                sp.save_npz(file, sp.csr_matrix(artifact))
+            else:
+                np.savez(file, graph=type(artifact).__name__, position_names=artifact.position_names,
+                         **artifact.arrays())
+        os.replace(path + '.tmp', path)  # never leave a partial artifact
+        logging.info("save the artifact %s" % key)
+
+    def run(self, stage, function, args, inputs=(), params=(), functions=()):
+        """
+        The artifact of function(*args), loaded from the cache when its key is there
+
+        functions are the other code the stage depends on (see key), besides the module of function.
+        Returns the artifact and its key, to be used as an input of the next stages.
+        """
+        key = self.key(stage, [function] + list(functions), inputs, params)
+        if self.has(key):
+            return self.load(key), key
+
+        result = function(*args)
+        self.save(key, result)
+        return result, key
@@ -9,7 +9,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.getcwd()))
 sys.path.append(BASE_DIR)
 sys.path.append('TCFPACN')
 
-from FBTP import greedy
+from FBTP import greedy, modules
 from FBTP import players as ps
 
 import numpy as np
@@ -19,7 +19,7 @@ from scipy.stats import rankdata
 def FBTP(gks, abi_name_id,
          p_no_id_back, pg_back, cri_back,
          p_no_id_forward, pg_forward, cri_forward,
-         budget, alpha, beta, datasource):
+         budget, alpha, beta, datasource, pruning="cf", seed=None, cache=False):
 
     """
     FUNCTION: team composition based on Finding Best Team with Pruning (FBTP) model
@@ -51,11 +51,24 @@ def FBTP(gks, abi_name_id,
 
     --> datasource:
         Indica o conjunto de dados usado (PES ou FIFA).
+
+    --> pruning:
+        Estratégia de poda: "cf" (um corte por vez pelo custo-benefício, <prune_steps>)
+        ou "knapsack" (todas as trocas de uma vez, <repair_knapsack>); outro valor gera ValueError.
+
+    --> seed:
+        Semente do PSO que seleciona o time sem restrição de orçamento; com a mesma semente,
+        o mesmo time é encontrado.
+
+    --> cache:
+        Se True, o PSO e a poda (<select_candidate>) consultam o cache de times de cada rede
+        (<modules.team_cache>), em vez de reavaliar os times que se repetem.
     """
 
-    print("The Budget Constraint is:%.3f" % budget)
+    if pruning not in ("cf", "knapsack"):
+        raise ValueError("unknown pruning %r, expected 'cf' or 'knapsack'" % (pruning,))
 
-    team = {}
+    print("The Budget Constraint is:%.3f" % budget)
 
     # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
     # +                                                                 +
@@ -66,10 +79,71 @@ def FBTP(gks, abi_name_id,
     """
     - Escolhe o melhor goleiro com base na média de suas habilidades.
     - Seleciona os melhores jogadores de defesa e ataque/meio-campo
-        usando <greedy.player_opt_subgraph>, que encontra o subgrafo ótimo
-          no grafo de jogadores, maximizando uma combinação de habilidades e homogeneidade.
+        usando <greedy.player_opt_subgraph_pso> no modo discreto, que encontra o subgrafo ótimo
+          no grafo de jogadores, maximizando uma combinação de habilidades e homogeneidade,
+          só com times que respeitam as cotas de posição (<greedy.position_slots>).
     """
     print('Select the players without budget constraint ')
+    state = unconstrained_state(gks, abi_name_id,
+                                p_no_id_back, pg_back, cri_back,
+                                p_no_id_forward, pg_forward, cri_forward,
+                                alpha, beta, datasource, seed, cache)
+
+
+    # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+    # +                                                                 +
+    # +         Pruning if necessary                                    +
+    # +                                                                 +
+    # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+    """
+    - Se o custo da equipe exceder o orçamento, entra em um loop de poda:
+    --> Remove o jogador com o menor custo-benefício usando <cut_base_cf>.
+    --> Seleciona um jogador candidato para substituir o jogador removido,
+        buscando um jogador com boa habilidade, homogeneidade e que se encaixe no orçamento.
+    --> Atualiza custo, habilidade média, homogeneidade e custo-benefício da equipe
+        apenas com a diferença da troca (<PruneState>), sem recalcular o time inteiro.
+    - Repete o processo de poda até que o custo da equipe esteja dentro do orçamento
+        (ou até que nenhum jogador tenha substituto mais barato).
+    - Com pruning="knapsack", as trocas são escolhidas todas de uma vez por <repair_knapsack>;
+        se nenhuma escolha couber no orçamento, segue com a poda por custo-benefício.
+    - Retorna o time final selecionado, que atende à restrição de orçamento
+        e maximiza a habilidade e homogeneidade.
+    """
+    if pruning == "knapsack" and state.cost >= budget:
+        if repair_knapsack(state, budget):
+            print('Repairing... the current team cost is %.2f' % state.cost)
+        else:
+            print('No replacement set fits the budget, pruning one player at a time')
+    for _ in prune_steps(state, budget):
+        print('Pruning... the current team cost is %.2f' % state.cost)
+    if state.cost >= budget:
+        print('No cheaper candidate for any player, the budget cannot be satisfied')
+
+    team_real = real_team(state, p_no_id_back, p_no_id_forward)
+    player_cf = {team_real[pos][state.team[pos].index(p)]: cf for (pos, p), cf in state.player_cf.items()}
+
+    print("\n",
+          "\t", "Os jogadores otimizados são:", team_real, "\n",
+          "\t", "O custo total é:", round(state.cost, 3), "\n",
+          "\t", "A habilidade média da equipe é:", round(state.ability(), 3), "\n",
+          "\t", "O desempenho de custo é:", player_cf, "\n",
+          "\t", "A homogeneidade do retrocesso é:%.4f" % state.homo("Back"), "\n",
+          "\t", "A heterogeneidade do atacante/meio-campista é: %.4f" % state.homo("Forward"),
+          "\n")
+
+    return team_real
+
+
+# Seleciona o time sem restrição de orçamento e retorna o seu <PruneState>.
+def unconstrained_state(gks, abi_name_id,
+                        p_no_id_back, pg_back, cri_back,
+                        p_no_id_forward, pg_forward, cri_forward,
+                        alpha, beta, datasource, seed=None, cache=False):
+
+    # the team cache of each network, if enabled
+    caches = {pos: modules.team_cache(pg) if cache else None for pos, pg in (("Back", pg_back), ("Forward", pg_forward))}
+    team = {}
+
     # find the best goalkeeper
     team["GK"] = list()
     best_gk = best_goalkeeper(gks)
@@ -77,93 +151,234 @@ def FBTP(gks, abi_name_id,
 
     # select the best backwards
     team["Back"] = list()
-    opt_back = greedy.player_opt_subgraph(p_no_id_back, pg_back, cri_back,
-                                          abi_name_id, alpha, beta, 'Back',
-                                          datasource
-                                          )
-    team["Back"] = opt_back
+    opt_back = greedy.player_opt_subgraph_pso(p_no_id_back, pg_back, cri_back,
+                                              abi_name_id, alpha, beta, 'Back',
+                                              datasource, seed=seed, discrete=True,
+                                              cache=caches["Back"]
+                                             )
+    id_no_back = {player_id: no for no, player_id in p_no_id_back.items()}
+    team["Back"] = [id_no_back[player_id] for player_id in opt_back]
 
     # select the forward/midfielder
     team["Forward"] = list()
-    opt_forward = greedy.player_opt_subgraph(p_no_id_forward, pg_forward, cri_forward,
-                                             abi_name_id, alpha, beta, 'Forward',
-                                             datasource
-                                            )
-    team["Forward"] = opt_forward
+    opt_forward = greedy.player_opt_subgraph_pso(p_no_id_forward, pg_forward, cri_forward,
+                                                 abi_name_id, alpha, beta, 'Forward',
+                                                 datasource, seed=seed, discrete=True,
+                                                 cache=caches["Forward"]
+                                                )
+    id_no_forward = {player_id: no for no, player_id in p_no_id_forward.items()}
+    team["Forward"] = [id_no_forward[player_id] for player_id in opt_forward]
 
     # 1. calculate the total cost
     # 2. calculate the  average team ability
     # 3. calculate the heterogeneity
-    team_cost, team_ability, homo_back, homo_forward, opt_player_cf \
-        = cal_cost_abi_homo(team, gks, pg_back, pg_forward, cri_back,
-                            cri_forward, abi_name_id
-                           )
+    state = PruneState(team, gks, pg_back, pg_forward, cri_back, cri_forward, abi_name_id, caches)
 
+    return state
+
+
+"""
+- Executa a poda por custo-benefício (<cut_base_cf>) sobre o <PruneState>, no lugar,
+    enquanto o custo do time não estiver abaixo do orçamento.
+- Um gerador: produz o estado após cada troca, ou seja, a trajetória da poda.
+- Para quando o orçamento é atendido ou quando nenhum jogador tem substituto mais barato.
+- As decisões de corte não dependem do orçamento, então a trajetória para um orçamento
+    menor é uma continuação da trajetória para um orçamento maior.
+"""
+def prune_steps(state, budget, alpha=0.7, beta=0.15):
+
+    fixed = set()  # players without a cheaper candidate for the current team
+    while state.cost >= budget:
+
+        # Pruning
+        cut_player, candidate = cut_base_cf(state, alpha=alpha, beta=beta, fixed=fixed)
+        if cut_player is None:
+            break
+        if candidate is None:
+            fixed.add((cut_player.get_cut_pos(), cut_player.get_id()))
+            continue
+        fixed.clear()
+
+        yield state
+
+
+"""
+- Reparo do orçamento como uma mochila de múltipla escolha, alternativa a <prune_steps>:
+    em vez de um corte por iteração, todas as trocas são escolhidas de uma vez.
+- Cada posição do time (goleiro, e cada posição exata da defesa e do ataque/meio-campo)
+    é um grupo: escolhem-se tantos jogadores distintos quanto a posição tem no time,
+    entre os atuais e os vizinhos (mesma posição) do resto da linha, como em <select_candidate>.
+- Valor de cada opção: alpha * habilidade (dividida pela maior da rede) + beta * densidade
+    com o resto da linha; a homogeneidade não é separável por jogador e fica de fora.
+- Os salários são arredondados para cima em num_buckets faixas do orçamento e uma programação
+    dinâmica sobre as faixas escolhe o conjunto de maior valor com custo abaixo do orçamento.
+- Atualiza o <PruneState> no lugar; retorna False (sem mudanças) se nenhuma escolha cabe no orçamento.
+"""
+def repair_knapsack(state, budget, alpha=0.7, beta=0.15, num_buckets=1000):
+
+    unit = budget / num_buckets
+    capacity = num_buckets - 1  # strictly under the budget
+
+    groups = knapsack_groups(state, alpha, beta)
+    dp = np.zeros(capacity + 1)  # best value with at most b buckets
+    takes = []
+    for group in groups:
+        k = len(group['members'])
+        weights = np.ceil(group['costs'] / unit).astype(np.int64)
+        group['weights'] = weights
+        group_dp = np.full((k + 1, capacity + 1), -np.inf)  # j players chosen in the group
+        group_dp[0] = dp
+        take = np.zeros((len(weights), k + 1, capacity + 1), dtype=bool)
+        for i, (w, v) in enumerate(zip(weights.tolist(), group['values'].tolist())):
+            if w > capacity:
+                continue
+            for j in range(min(k, i + 1), 0, -1):
+                value = np.full(capacity + 1, -np.inf)
+                value[w:] = group_dp[j-1][:capacity + 1 - w] + v
+                better = value > group_dp[j]
+                group_dp[j][better] = value[better]
+                take[i, j] = better
+        dp = group_dp[k]
+        takes.append(take)
+
+    if not np.isfinite(dp[capacity]):
+        return False
+
+    # the chosen players, from the last group back to the first
+    b = capacity
+    chosen = []
+    for group, take in zip(reversed(groups), reversed(takes)):
+        j = len(group['members'])
+        players = []
+        for i in range(len(group['options']) - 1, -1, -1):
+            if j > 0 and take[i, j, b]:
+                players.append(int(group['options'][i]))
+                b -= group['weights'][i]
+                j -= 1
+        chosen.append((group, players))
+
+    for group, players in chosen:
+        out = [p for p in group['members'] if p not in players]
+        new = [p for p in players if p not in group['members']]
+        for p, candidate in zip(out, new):
+            state.replace(group['pos'], p, candidate)
+
+    return True
+
+
+# Os grupos (posição, jogadores atuais, opções, salários e valores) de <repair_knapsack>.
+def knapsack_groups(state, alpha, beta):
+    groups = []
+
+    gks = list(state.gks.values())
+    gk_abilities = np.array([sum(gk.ability) / len(gk.ability) for gk in gks])
+    groups.append({'pos': "GK",
+                   'members': list(state.team["GK"]),
+                   'options': np.array([gk.get_id() for gk in gks]),
+                   'costs': np.array([gk.get_salary() for gk in gks], dtype=float),
+                   'values': alpha * gk_abilities / gk_abilities.max()})
+
+    for pos, pg in state.graphs.items():
+        graph = ps.as_array_graph(pg)
+        members = state.team[pos]
+        codes = graph.position_code[members].tolist()
+        for code in sorted(set(codes)):
+            group = [p for p, c in zip(members, codes) if c == code]
+            rest = [p for p, c in zip(members, codes) if c != code]
+            pool = pg.team_neighbors(rest) if rest else np.arange(graph.numVertices)
+            pool = pool[(graph.position_code[pool] == code) & ~np.isin(pool, members)]
+            options = np.concatenate((np.array(group, dtype=np.int64), pool))
+
+            density = np.zeros(len(options))
+            if rest:
+                density = graph.pair_weights(np.repeat(options, len(rest)), np.tile(rest, len(options)))\
+                               .reshape(len(options), len(rest)).mean(axis=1)
+            abilities = state.abilities[pos]
+            groups.append({'pos': pos,
+                           'members': group,
+                           'options': options,
+                           'costs': state.salaries[pos][options],
+                           'values': alpha * abilities[options] / abilities.max() + beta * density})
+
+    return groups
+
+
+# Converte os índices dos jogadores do <PruneState> para os IDs reais.
+def real_team(state, p_no_id_back, p_no_id_forward):
+    return {"GK": list(state.team["GK"]),
+            "Back": [p_no_id_back[i] for i in state.team["Back"]],
+            "Forward": [p_no_id_forward[i] for i in state.team["Forward"]]}
+
+
+def FBTP_sweep(gks, abi_name_id,
+               p_no_id_back, pg_back, cri_back,
+               p_no_id_forward, pg_forward, cri_forward,
+               budgets, alpha, beta, datasource, seed=None, cache=False):
 
-    # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-    # +                                                                 +
-    # +         Pruning if necessary                                    +
-    # +                                                                 +
-    # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
     """
-    - Se o custo da equipe exceder o orçamento, entra em um loop de poda:
-    --> Calcula o custo, habilidade média, homogeneidade e custo-benefício da equipe.
-    --> Remove o jogador com o menor custo-benefício usando <cut_base_cf>.
-    --> Seleciona um jogador candidato para substituir o jogador removido,
-        buscando um jogador com boa habilidade, homogeneidade e que se encaixe no orçamento.
-    - Repete o processo de poda até que o custo da equipe esteja dentro do orçamento.
-    - Retorna o time final selecionado, que atende à restrição de orçamento
-        e maximiza a habilidade e homogeneidade.
+    FUNCTION: FBTP for several budgets with a single pruning trajectory
+
+    - O time sem restrição de orçamento é selecionado uma única vez e podado
+        até o menor orçamento; como as decisões de corte não dependem do orçamento
+        (<prune_steps>), o time de cada orçamento é o primeiro da trajetória com custo abaixo dele.
+    - É o mesmo time que <FBTP> encontraria para aquele orçamento (com pruning="cf") só se
+        as duas partirem do mesmo time sem restrição, ou seja, com a mesma seed do PSO.
+    - budgets: Lista (ou range/array) de orçamentos.
+    - seed: Semente do PSO que seleciona o time sem restrição de orçamento.
+    - cache: Se True, usa o cache de times de cada rede, como em <FBTP>.
+
+    Returns:
+        teams: Dicionário {orçamento: ponto da trajetória}, None se o orçamento não pôde ser atendido.
+        frontier: Os pontos da trajetória na fronteira de Pareto, ordenados pelo custo.
+        Cada ponto é um dicionário com o time (IDs reais), o custo, a habilidade média
+        e a homogeneidade da defesa e do ataque/meio-campo.
     """
-    team_real = {"GK": [], "Back": [], "Forward": []}
-
-    # Converter índices da gbest para IDs de jogadores
-    # team_real["GK"].append(player_no_id_back[gbest[0]])  # Goleiro
-    # team_real["Back"] = [player_no_id_back[i] for i in gbest[1:5]]  # Defesa
-    # team_real["Forward"] = [player_no_id_forward[i] for i in gbest[5:]]  # Ataque/Meio-campo
-
-    while True:
-
-        if team_cost < budget:
-            team_real["GK"].append(player_no_id_back[gbest[0]])  # Goleiro
-
-            for i in team["Back"]:
-                team_real["Back"] = [player_no_id_back[i] for i in gbest[1:5]]  # Defesa
-
-            for j in team["Forward"]:
-                team_real["Forward"] = [player_no_id_forward[i] for i in gbest[5:]]  # Ataque/Meio-campo
-            
-                       
-            print("\n",
-                  "\t", "Os jogadores otimizados são:", team_real, "\n",
-                  "\t", "O custo total é:", round(-gbest_fitness, 3), "\n",  # Usar o fitness da gbest
-                  "\t", "A habilidade média da equipe é:", round(team_ability, 3), "\n",
-                  "\t", "O desempenho de custo é:", opt_player_cf, "\n",
-                  "\t", "A homogeneidade do retrocesso é:%.4f" % homo_back, "\n",
-                  "\t", "A heterogeneidade do atacante/meio-campista é: %.4f" % homo_forward,
-                  "\n")
 
-            break
-        else:
-            # Pruning
-            team_update = cut_base_cf(opt_player_cf, team, pg_back, pg_forward, gks,
-                                      cri_back, cri_forward, abi_name_id,
-                                      alpha=0.7, beta=0.15)
-            # calculate cost, average ability and homogeneity
-            team_up_cost, team_up_ability, homo_up_back, homo_up_forward, opt_player_cf_up\
-                = cal_cost_abi_homo(team, gks, pg_back, pg_forward, cri_back, cri_forward, abi_name_id)
-
-            # update
-            team = team_update
-            team_cost = team_up_cost
-            team_ability = team_up_ability
-            homo_back = homo_up_back
-            homo_forward = homo_up_forward
-            opt_player_cf = opt_player_cf_up
-
-            print('Pruning... the current team cost is %.2f' % team_cost)
+    budgets = sorted(budgets, reverse=True)
 
-    return team_real
+    print('Select the players without budget constraint ')
+    state = unconstrained_state(gks, abi_name_id,
+                                p_no_id_back, pg_back, cri_back,
+                                p_no_id_forward, pg_forward, cri_forward,
+                                alpha, beta, datasource, seed, cache)
+
+    def snapshot():
+        return {'team': real_team(state, p_no_id_back, p_no_id_forward),
+                'cost': state.cost,
+                'ability': state.ability(),
+                'homo_back': state.homo("Back"),
+                'homo_forward': state.homo("Forward")}
+
+    trajectory = [snapshot()]
+    teams = {}
+    for budget in budgets:
+        if state.cost >= budget:
+            for _ in prune_steps(state, budget):
+                trajectory.append(snapshot())
+        teams[budget] = trajectory[-1] if state.cost < budget else None
+        print('Budget %.3f: the team cost is %.3f' % (budget, state.cost))
+
+    frontier = pareto_frontier(trajectory)
+
+    return teams, frontier
+
+
+"""
+- Os pontos não dominados de uma lista de times (dicionários de <FBTP_sweep>).
+- Objetivos: maior habilidade média, menor Gini da defesa (homogeneidade),
+    maior Gini do ataque/meio-campo (heterogeneidade) e menor custo.
+- Retorna os pontos ordenados pelo custo.
+"""
+def pareto_frontier(points):
+
+    if not points:
+        return []
+    # every objective to be maximized
+    scores = np.array([[p['ability'], -p['homo_back'], p['homo_forward'], -p['cost']] for p in points])
+    dominated = ((scores[:, None, :] <= scores[None, :, :]).all(axis=2) &
+                 (scores[:, None, :] < scores[None, :, :]).any(axis=2)).any(axis=1)
+
+    return sorted((p for p, d in zip(points, dominated) if not d), key=lambda p: p['cost'])
 
 # Encontra o goleiro com a maior média de habilidades.
 def best_goalkeeper(gks):
@@ -179,152 +394,176 @@ def best_goalkeeper(gks):
 
     return opt_gk
 
-# Calcula o custo total da equipe, habilidade média, homogeneidade e custo-benefício de cada jogador.
-def cal_cost_abi_homo(particle, pg_back, pg_forward, cri_back, cri_for, abi_name_id, budget):
+class PruneState:
     """
-    Calcula o fitness da equipe representada pela partícula.
-
-    Args:
-        particle: Array representando a partícula (índices dos jogadores no grafo).
-        pg_back: Grafo dos jogadores de defesa.
-        pg_forward: Grafo dos jogadores de ataque/meio-campo.
-        cri_back: Critérios de avaliação para jogadores de defesa.
-        cri_for: Critérios de avaliação para jogadores de ataque/meio-campo.
-        abi_name_id: Dicionário que mapeia nomes de habilidades para seus IDs.
-        budget: Orçamento máximo da equipe.
+    The team being pruned, with its aggregates kept up to date
 
-    Returns:
-        O fitness da equipe (um valor negativo para indicar que deve ser minimizado).
+    The total cost, the sum of the abilities, the cost performance of every
+    player and the ability statistics of the Back and Forward lines
+    (players.TeamStats) are updated with the difference of each replacement,
+    so a pruning step costs O(team) instead of a full recomputation.
+    caches holds the optional team cache of each line, used by select_candidate.
     """
 
-    team_cost = 0
-    team_ability = 0
-    homo_back = 0
-    homo_forward = 0
-
-    # Considerar o goleiro (primeiro elemento da partícula)
-    gk_idx = particle[0]
-    gk = next((gk for gk in gks if gk.id == player_no_id_back[gk_idx]), None) # Assuming gks is a global variable or accessible from this scope
-    if gk is None:
-        return -np.inf  # Goleiro inválido, fitness muito baixo
-    team_cost += gk.get_salary()
-    team_ability += sum(gk.ability) / len(gk.ability)
-
-    # Considerar os jogadores de defesa (próximos 4 elementos da partícula)
-    back_indices = particle[1:5]
-    homo_back = cal_homo(back_indices, pg_back)
-    for i in back_indices:
-        cost = pg_back.vertexList[i].salary
-        team_cost += cost
-        abi = cal_player_ability(pg_back.vertexList[i].abilities, cri_back, abi_name_id)
-        team_ability += abi
-
-    # Considerar os jogadores de ataque/meio-campo (últimos 6 elementos da partícula)
-    forward_indices = particle[5:]
-    homo_forward = cal_homo(forward_indices, pg_forward)
-    for j in forward_indices:
-        cost = pg_forward.vertexList[j].salary
-        team_cost += cost
-        abi = cal_player_ability(pg_forward.vertexList[j].abilities, cri_for, abi_name_id)
-        team_ability += abi
-
-    team_ability /= 11  # Média da habilidade da equipe (11 jogadores)
-
-    # Penalizar se o custo exceder o orçamento
-    cost_penalty = max(0, team_cost - budget) * 100  # Ajuste o fator de penalidade conforme necessário
-
-    # O fitness é a soma ponderada da habilidade e da homogeneidade, com penalidade por custo
-    fitness = alpha * team_ability + (1 - alpha - beta) * (1 - homo_back) + beta * homo_forward - cost_penalty
-
-    return -fitness  # Retornamos o negativo para que o PSO minimize o valor (maior fitness)
+    def __init__(self, team, gks, pg_back, pg_forward, cri_back, cri_for, abi_name_id, caches=None):
+        self.team = {pos: list(players) for pos, players in team.items()}  # "GK" holds goalkeeper ids
+        self.gks = {gk.get_id(): gk for gk in gks}
+        self.graphs = {"Back": pg_back, "Forward": pg_forward}
+        self.criteria = {"Back": cri_back, "Forward": cri_for}
+        self.abi_name_id = abi_name_id
+        self.caches = caches or {}
+        self.abilities = {pos: greedy.cal_players_ability(pg, self.criteria[pos], abi_name_id)
+                          for pos, pg in self.graphs.items()}
+        self.salaries = {pos: ps.as_array_graph(pg).salary for pos, pg in self.graphs.items()}
+        self.stats = {pos: ps.TeamStats(pg, self.team[pos]) for pos, pg in self.graphs.items()}
+
+        self.cost = 0
+        self.ability_sum = 0
+        self.player_cf = {}  # (pos, player id) : cost performance
+        for pos, players in self.team.items():
+            for player in players:
+                self._enter(pos, player)
+
+    def copy(self):
+        state = PruneState.__new__(PruneState)
+        state.__dict__.update(self.__dict__)
+        state.team = {pos: list(players) for pos, players in self.team.items()}
+        state.stats = {pos: stats.copy() for pos, stats in self.stats.items()}
+        state.player_cf = dict(self.player_cf)
+        return state
+
+    def cost_ability(self, pos, player):
+        """
+        The salary and the personal ability of a player
+        """
+        if pos == "GK":
+            gk = self.gks[player]
+            return gk.get_salary(), sum(gk.ability) / len(gk.ability)
+        return self.salaries[pos][player], self.abilities[pos][player]
+
+    def _enter(self, pos, player):
+        cost, ability = self.cost_ability(pos, player)
+        self.cost += cost
+        self.ability_sum += ability
+        self.player_cf[(pos, player)] = float(ability / cost)
+
+    def _leave(self, pos, player):
+        cost, ability = self.cost_ability(pos, player)
+        self.cost -= cost
+        self.ability_sum -= ability
+        del self.player_cf[(pos, player)]
+
+    def replace(self, pos, out, player):
+        """
+        Replace the player <out> by <player>
+        """
+        self._leave(pos, out)
+        self._enter(pos, player)
+        players = self.team[pos]
+        players[players.index(out)] = player
+        if pos in self.stats:
+            self.stats[pos].swap(out, player)
+
+    def ability(self):  # the average ability of the team
+        return self.ability_sum / sum(len(players) for players in self.team.values())
+
+    def homo(self, pos):  # the Gini coefficient of the Back or Forward line
+        return self.stats[pos].gini()
+
+    def lowest_cf(self, fixed=()):
+        """
+        The (pos, player id) with the lowest cost performance, ignoring <fixed>
+        """
+        cf_min = sys.maxsize
+        lowest = None
+        for key, cf in self.player_cf.items():
+            if cf < cf_min and key not in fixed:
+                cf_min = cf
+                lowest = key
+        return lowest
 
 
 # Remove o jogador com o menor custo-benefício e encontra um candidato para substituí-lo.
-def cut_base_cf(player_cf, team, pg_back, pg_forward, gks, cri_back, cri_for, abi_name_id, alpha, beta):
+def cut_base_cf(state, alpha, beta, fixed=()):
     """
     FUNCTION: Pruning based on the cost performance
+
+    - O time é um <PruneState>, atualizado no lugar quando há um candidato.
+    - Os jogadores em fixed (pares (pos, ID)) não são considerados para o corte.
+    - Retorna (cut_player, candidate): o jogador cortado (None se todos estão em fixed)
+        e o seu substituto (None se não há jogador mais barato).
     """
 
     # 1. find the player with the lowest of cost performance
-    cut_player = ps.CutPlayer(None)
-    cf_min = sys.maxsize
-    for p, cf in player_cf.items():
-        if cf < cf_min:
-            cf_min = cf
-            cut_player.id = p
+    lowest = state.lowest_cf(fixed)
+    if lowest is None:
+        return None, None
+    cut_player = ps.CutPlayer(lowest[1])
+    cut_player.cut_pos = lowest[0]
+    cut_player.cut_salary = state.cost_ability(*lowest)[0]
 
     # 2. delete the player
-    for pos, players in team.items():
-        if cut_player.id in players:
-            players.remove(cut_player.id)
-            cut_player.cut_pos = pos
-            break
+    team_sub = [p for p in state.team[cut_player.get_cut_pos()] if p != cut_player.get_id()]
 
     # 3. find candidate player
     candidate = None
 
-    if cut_player.get_cut_pos() == "Back":
-
-        cut_player.cut_salary = pg_back.vertexList[cut_player.get_id()].salary
-        cut_player.cut_position = pg_back.vertexList[cut_player.get_id()].position
-        candidate = select_candidate(team[cut_player.get_cut_pos()], pg_back, cut_player,
-                                     cri_back, abi_name_id, alpha, beta)
-        team[cut_player.get_cut_pos()].append(candidate)
-
-    elif cut_player.get_cut_pos() == "Forward":
+    if cut_player.get_cut_pos() in ("Back", "Forward"):
 
-        cut_player.cut_salary = pg_forward.vertexList[cut_player.get_id()].salary
-        cut_player.cut_position = pg_forward.vertexList[cut_player.get_id()].position
-        candidate = select_candidate(team[cut_player.get_cut_pos()], pg_forward, cut_player,
-                                     cri_for, abi_name_id, alpha, beta)
-        team[cut_player.get_cut_pos()].append(candidate)
+        pg = state.graphs[cut_player.get_cut_pos()]
+        cut_player.cut_position = pg.vertexList[cut_player.get_id()].position
+        candidate = select_candidate(team_sub, pg, cut_player,
+                                     state.criteria[cut_player.get_cut_pos()], state.abi_name_id, alpha, beta,
+                                     cache=state.caches.get(cut_player.get_cut_pos()))
 
     else:
         # the player to be cut is goalkeeper
         opt_abi = 0
-        for gk in gks:
+        for gk in state.gks.values():
             if gk.id == cut_player.get_id():
-                cut_player.cut_salary = gk.get_salary()
                 continue
             abi = sum(gk.ability)/len(gk.ability)
             if opt_abi < abi and gk.get_salary() < cut_player.get_cut_salary():
                 opt_abi = abi
                 candidate = gk.id
-        team["GK"].append(candidate)
 
-    return team
+    if candidate is not None:
+        state.replace(cut_player.get_cut_pos(), cut_player.get_id(), candidate)
+
+    return cut_player, candidate
 
 # Seleciona o melhor jogador candidato para substituir um jogador removido,
 # considerando habilidades, homogeneidade, densidade no grafo e salário.
-def select_candidate(team_sub, pg, cut_player, criteria, abi_name_id, alpha, beta):
+# cache: Opcional, o cache de times da rede (<modules.team_cache>) para o Gini de cada candidato.
+def select_candidate(team_sub, pg, cut_player, criteria, abi_name_id, alpha, beta, cache=None):
 
-    neighbor = list()
-    for player in team_sub:
-        for key in pg.vertexList[player].connectedTo.keys():
-            # focus only on the position to be cut and neglect the players has been selected
-            if key.id not in neighbor and\
-                    key.id not in team_sub and key.id != cut_player.get_id() and\
-                    key.position == cut_player.get_cut_position():
-                neighbor.append(key.id)
+    # focus only on the position to be cut and neglect the players has been selected
+    graph = ps.as_array_graph(pg)
+    neighbor = pg.team_neighbors(team_sub)
+    cut_position = np.flatnonzero(graph.position_names == cut_player.get_cut_position())
+    neighbor = neighbor[np.isin(graph.position_code[neighbor], cut_position) &
+                        (neighbor != cut_player.get_id())].tolist()
 
     # function = ability + density + homogeneity
     density = {}
     team_ability = {}
     team_gini = {}
     team_homo = {}
-    for ne in neighbor:
+    abilities = greedy.cal_players_ability(pg, criteria, abi_name_id)  # personal abilities
+    gini_all = greedy.cal_homogeneity_batch(pg, team_sub, neighbor, cache)
+    for c, ne in enumerate(neighbor):
 
-        ne_abi = greedy.cal_player_ability(
-            pg.vertexList[ne].abilities, criteria, abi_name_id)
+        ne_abi = abilities[ne]
 
         weight = 0
         te_abi = ne_abi
         for op in team_sub:
-            if pg.vertexList[op] in pg.vertexList[ne].connectedTo:
-                weight += pg.vertexList[ne].get_weight(pg.vertexList[op])
-                te_abi += greedy.cal_player_ability(pg.vertexList[op].abilities, criteria, abi_name_id)
+            w = pg.weight(ne, op)
+            if w > 0:
+                weight += w
+                te_abi += abilities[op]
 
-        gini = greedy.cal_homogeneity(pg.vertexList, ne, team_sub)
+        gini = gini_all[c]
 
         d = weight / (len(team_sub) + 1)
         density[ne] = d
@@ -360,41 +599,3 @@ def select_candidate(team_sub, pg, cut_player, criteria, abi_name_id, alpha, bet
             candidate = player_id
 
     return candidate
-
-# Calcula a homogeneidade da equipe usando o índice de Gini.
-def cal_homo(team, pg):
-    homo = 0
-    diff = {}
-    avg_tmp = {}
-    avg = {}
-    gini_co = {}
-
-    for i in range(0, len(team)):
-        for j in range(0, len(team)):
-            for abi_id in pg.vertexList[i].abilities.keys():
-                d = abs(pg.vertexList[team[i]].abilities[abi_id] -
-                        pg.vertexList[team[j]].abilities[abi_id])
-                if abi_id not in diff:
-                    diff[abi_id] = d
-                else:
-                    diff[abi_id] += d
-
-    for player in team:
-        for abi_id in pg.vertexList[player].abilities.keys():
-            if abi_id not in avg_tmp:
-                avg_tmp[abi_id] = pg.vertexList[player].abilities[abi_id]
-            else:
-                avg_tmp[abi_id] += pg.vertexList[player].abilities[abi_id]
-
-    for abi_id, value in avg_tmp.items():
-        avg[abi_id] = avg_tmp[abi_id]/len(team)
-
-    for abi_id in diff.keys():
-        gini_co[abi_id] = (1 / (2 * pow(len(team), 2) * avg[abi_id])) * diff[abi_id]
-
-    for value in gini_co.values():
-        homo += value
-
-    homo = homo / len(gini_co)
-
-    return homo
\ No newline at end of file
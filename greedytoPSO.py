@@ -18,8 +18,10 @@ sys.path.append('TCFPACN')
 
 from FBTP import players, modules
 import re
-import math
+import time
+import weakref
 import numpy as np
+import scipy.sparse as sp
 
 
 """
@@ -44,13 +46,7 @@ def players_graph_construction(sim, abi_avg, abis_name, abi_name_id, pos, rating
     # player_rating = modules.player_rating
 
     # get the major abilities
-    ability_major = []
-    c = 1
-    tmp_sorted = sorted(abi_avg.items(), key=lambda x: x[1], reverse=True)
-    for abl in tmp_sorted:
-        if c <= 10:
-            ability_major.append(abl[0])
-            c += 1
+    ability_major = get_major_abilities(abi_avg)
     players_graph = players.Graph()
 
     # construct the players' network based on similarity
@@ -83,56 +79,460 @@ def players_graph_construction(sim, abi_avg, abis_name, abi_name_id, pos, rating
     return players_graph
 
 
+"""
+- Versão vetorizada de <players_graph_construction>, que retorna um players.ArrayGraph.
+- Todo o trabalho é feito com operações de arrays:
+  --> Seleciona as habilidades principais (ability_major) e monta a matriz de habilidades
+         (jogador x habilidade) somente com essas colunas.
+  --> Extrai as arestas diretamente da matriz de similaridade (densa ou scipy.sparse),
+         descartando a diagonal, no formato CSR.
+  --> Calcula o vetor de salários com <cal_player_salary> aplicado a todos os jogadores.
+- Diferente da versão original, o último jogador também é incluído.
+"""
+def players_graph_construction_bulk(sim, abi_avg, abis_name, abi_name_id, pos, rating):
+
+    no = sim.shape[0]
+
+    # the major abilities
+    ability_major = get_major_abilities(abi_avg)
+    abilities = np.column_stack([dict_to_array(abis_name[name], no) for name in ability_major])
+
+    adjacency = similarity_adjacency(sim)
+
+    salary = cal_player_salary(np.arange(no), dict_to_array(rating, no))
+
+    return players.ArrayGraph(adjacency.indptr, adjacency.indices, adjacency.data,
+                              dict_to_array(pos, no, dtype=object), salary,
+                              abilities, [abi_name_id[name] for name in ability_major]
+                             )
+
+
+# As arestas da rede (CSR): as similaridades não nulas fora da diagonal.
+def similarity_adjacency(sim):
+    no = sim.shape[0]
+    sim = sp.coo_matrix(sim)
+    keep = (sim.row != sim.col) & (sim.data != 0)
+    adjacency = sp.csr_matrix((sim.data[keep], (sim.row[keep], sim.col[keep])), shape=(no, no))
+    adjacency.sum_duplicates()  # sorts the neighbors of each player
+    return adjacency
+
+
+"""
+- Versões de <players_graph_construction_bulk> e <players_graph_construction_compressed>
+    que recebem um dataset.PlayerTable: posições, salários e habilidades principais são
+    fatiados das colunas da tabela, sem passar pelos dicionários de <read_info>.
+- Sem sim, a similaridade é calculada com o motor esparso (<modules.cal_similarity_sparse>).
+"""
+def players_graph_construction_table(network_name, table, sim=None):
+    if sim is None:
+        sim = modules.cal_similarity_sparse(network_name, table.attributes())
+    adjacency = similarity_adjacency(sim)
+    return players.ArrayGraph(adjacency.indptr, adjacency.indices, adjacency.data, *table_vertices(table))
+
+
+def players_graph_construction_compressed_table(network_name, table):
+    class_sim, player_class = modules.cal_class_similarity(network_name, table.attributes())
+    return players.ClassGraph(class_sim, player_class, *table_vertices(table))
+
+
+# Posição, salário, habilidades principais e seus IDs de cada jogador da tabela.
+def table_vertices(table):
+    ability_major = get_major_abilities(table.ability_avg())
+    ability_name_id = table.ability_name_id
+    major_ids = [ability_name_id[name] for name in ability_major]
+    return table.position_labels(), np.asarray(table.salary), np.asarray(table.abilities)[:, major_ids], major_ids
+
+
+# Converte um dicionário {número do jogador: valor} em um array indexado pelo número do jogador.
+def dict_to_array(values, no, dtype=float):
+    array = np.zeros(no, dtype=dtype)
+    array[np.fromiter(values.keys(), dtype=np.int64, count=len(values))] = list(values.values())
+    return array
+
+
+"""
+- Constrói a rede comprimida de jogadores (players.ClassGraph).
+- Jogadores com o mesmo par [clube, nacionalidade] formam uma classe de equivalência;
+    a rede guarda apenas a tabela de similaridade classe x classe e o índice jogador -> classe,
+    sem materializar as cliques redundantes entre jogadores da mesma classe.
+- Os vértices recebem as mesmas habilidades, posição e salário de <players_graph_construction>.
+"""
+def players_graph_construction_compressed(network_name, attributes, abi_avg, abis_name, abi_name_id, pos, rating):
+
+    class_sim, player_class = modules.cal_class_similarity(network_name, attributes)
+
+    no = len(attributes)
+    ability_major = get_major_abilities(abi_avg)
+    abilities = np.array([[abis_name[name].get(i, 0) for name in ability_major] for i in range(no)])
+    salary = [cal_player_salary(i, rating) for i in range(no)]
+
+    return players.ClassGraph(class_sim, player_class, [pos[i] for i in range(no)], salary,
+                              abilities, [abi_name_id[name] for name in ability_major]
+                             )
+
+
+# Retorna as 10 habilidades com maior média (as habilidades principais).
+def get_major_abilities(abi_avg, top=10):
+    tmp_sorted = sorted(abi_avg.items(), key=lambda x: x[1], reverse=True)
+    return [abl[0] for abl in tmp_sorted[:top]]
+
+
 # Calcula o salário de um jogador com base em seu rating, usando uma fórmula exponencial.
 def cal_player_salary(i, player_rating):
     eta = 0.0006375
     theta = 0.1029
-    salary = eta * math.exp(theta*player_rating[i])
+    salary = eta * np.exp(theta*player_rating[i])  # also works for an array of players
     return salary
 
 
-def player_opt_subgraph_pso(player_no_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource, num_particles=20, max_iterations=100):
+def player_opt_subgraph_pso(player_no_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource, num_particles=20, max_iterations=100, seed=None,
+                            stagnation=None, min_diversity=None, deadline=None, discrete=False, cache=None):
     """
     Encontra o subgrafo ótimo de jogadores usando PSO.
+    Os critérios de parada opcionais, o modo discreto e o cache são os de <player_opt_subgraph_pso_anytime>.
     """
 
-    num_players = 4 if network_name == "Back" else 6  # Número de jogadores na equipe (sem goleiro)
+    opt_players = None
+    for opt_players, _, _ in player_opt_subgraph_pso_anytime(player_no_id, pg, criteria, abi_name_id, alpha, beta,
+                                                              network_name, datasource, num_particles, max_iterations,
+                                                              seed, stagnation, min_diversity, deadline, discrete,
+                                                              cache):
+        pass
 
-    # Inicializar as partículas
-    particles = []
-    for _ in range(num_particles):
-        particle = np.random.choice(list(pg.vertexList.keys()), size=num_players, replace=False)
-        particles.append(particle)
-
-    velocities = np.random.rand(num_particles, num_players)  # Velocidades iniciais aleatórias
-    pbest = particles.copy()  # Melhores posições pessoais
-    gbest = None
-    gbest_fitness = -np.inf
-
-    # Iterações do PSO
-    for _ in range(max_iterations):
-        # Avaliar o fitness de cada partícula
-        fitness = np.array([cal_cost_abi_homo(particle, pg, criteria, abi_name_id, alpha, beta) for particle in particles])
-
-        # Atualizar pbest e gbest
-        for i in range(num_particles):
-            if fitness[i] > cal_cost_abi_homo(pbest[i], pg, criteria, abi_name_id, alpha, beta):
-                pbest[i] = particles[i]
-                if fitness[i] > gbest_fitness:
-                    gbest = particles[i]
-                    gbest_fitness = fitness[i]
-
-        # Atualizar velocidade e posição das partículas
-        for i in range(num_particles):
-            r1 = np.random.rand()
-            r2 = np.random.rand()
-            velocities[i] = velocities[i] + 2 * r1 * (pbest[i] - particles[i]) + 2 * r2 * (gbest - particles[i])
-            particles[i] = np.clip(particles[i] + velocities[i], 0, len(pg.vertexList) - 1).astype(int)
-
-    # Converter a melhor solução (gbest) para IDs de jogadores
-    opt_players = [player_no_id[i] for i in gbest] # não precisa mudar
     return opt_players
 
+
+def player_opt_subgraph_pso_anytime(player_no_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource, num_particles=20, max_iterations=100, seed=None,
+                                    stagnation=None, min_diversity=None, deadline=None, discrete=False, cache=None):
+    """
+    PSO como algoritmo "anytime": um gerador que produz (IDs dos jogadores, fitness, tempo decorrido em segundos)
+    sempre que o gbest melhora, começando pelo gbest da população inicial.
+
+    A busca para na primeira condição satisfeita:
+    --> max_iterations: número máximo de iterações (None para não limitar);
+    --> stagnation: número de iterações seguidas sem melhora do gbest;
+    --> min_diversity: diversidade do enxame (<Swarm.diversity>) abaixo do limiar;
+    --> deadline: tempo de relógio, em segundos (ex.: 0.2), desde o início da busca.
+    Quem tem limite de latência pode simplesmente ficar com o último time produzido.
+
+    Com discrete=True o enxame é um <SetSwarm>: só visita times viáveis, sem jogadores
+    repetidos e respeitando as cotas de posição de <get_position_num>.
+
+    cache: Opcional, o cache de times da rede (ex.: modules.team_cache(pg)); as partículas
+    que repetem um time já avaliado viram consultas ao cache (<TeamFitness>).
+    """
+
+    start = time.perf_counter()
+    num_players = 4 if network_name == "Back" else 6  # Número de jogadores na equipe (sem goleiro)
+
+    fitness = TeamFitness(pg, criteria, abi_name_id, alpha, beta, network_name, cache=cache)
+    if discrete:
+        slots, slot_pools = position_slots(pg, network_name, datasource)
+        swarm = SetSwarm(fitness, num_particles, slots, slot_pools, np.random.default_rng(seed))
+    else:
+        swarm = Swarm(fitness, num_particles, num_players, np.random.default_rng(seed))
+    yield [player_no_id[i] for i in swarm.gbest.tolist()], swarm.gbest_fitness, time.perf_counter() - start
+
+    iteration = 0
+    idle = 0  # iterations without improvement
+    while max_iterations is None or iteration < max_iterations:
+        if deadline is not None and time.perf_counter() - start >= deadline:
+            break
+
+        iteration += 1
+        if swarm.step():
+            idle = 0
+            yield [player_no_id[i] for i in swarm.gbest.tolist()], swarm.gbest_fitness, time.perf_counter() - start
+        else:
+            idle += 1
+
+        if stagnation is not None and idle >= stagnation:
+            break
+        if min_diversity is not None and swarm.diversity() < min_diversity:
+            break
+
+
+class TeamFitness:
+    """
+    Batched fitness of teams of one network (Back or Forward)
+
+    fitness = alpha * ability + beta * density + (1 - alpha - beta) * homogeneity
+    --> ability: average personal ability of the team, divided by the best personal ability
+    --> density: average similarity over all pairs of the team
+    --> homogeneity: 1 - Gini for the Back network, Gini (heterogeneity) for the Forward network
+    Teams with repeated players, or above the budget when one is given, get -inf.
+
+    The personal abilities, the ability matrix, the salaries and the adjacency are
+    taken once from the network, so a whole (teams x team size) array is scored
+    in one call. Caching is opt-in: with cache (e.g. modules.team_cache(pg))
+    scored teams are memoised, at the price of one Python key per row, which
+    only pays off when the same teams come back often.
+    """
+
+    def __init__(self, pg, criteria, abi_name_id, alpha, beta, network_name, budget=None, cache=None):
+        self.graph = players.as_array_graph(pg)
+        self.abilities = cal_players_ability(self.graph, criteria, abi_name_id)
+        self.ability_max = self.abilities.max()
+        self.matrix = self.graph.abilities
+        self.salary = self.graph.salary
+        self.alpha = alpha
+        self.beta = beta
+        self.network_name = network_name
+        self.budget = budget
+        self.cache = cache
+        self.criteria = (tuple(sorted(criteria.items())), network_name, budget)  # the cache key of the setting
+
+    def __call__(self, teams):
+        teams = np.atleast_2d(np.asarray(teams, dtype=np.int64))
+        if self.cache is None:
+            return self.evaluate(teams)
+
+        keys = [modules.team_key(self.criteria, self.alpha, self.beta, team) for team in teams.tolist()]
+        fitness = np.array([self.cache.get(key, np.nan) for key in keys])
+        missing = np.flatnonzero(np.isnan(fitness))
+        if len(missing):
+            fitness[missing] = self.evaluate(teams[missing])
+            for i in missing.tolist():
+                self.cache.put(keys[i], fitness[i])
+        return fitness
+
+    def evaluate(self, teams):
+        """
+        The fitness of every team (row), without the cache
+        """
+        teams = np.atleast_2d(np.asarray(teams, dtype=np.int64))
+        m = teams.shape[1]
+
+        ability = self.abilities[teams].mean(axis=1) / self.ability_max
+
+        first, second = np.triu_indices(m, 1)
+        density = self.graph.pair_weights(teams[:, first], teams[:, second]).mean(axis=1) if m > 1 \
+                  else np.zeros(len(teams))
+
+        rows = self.matrix[teams]  # teams x players x abilities
+        diff = np.abs(rows[:, :, None, :] - rows[:, None, :, :]).sum(axis=(1, 2))
+        gini = players.gini_mean(diff, 2 * m * rows.sum(axis=1))
+        homo = 1 - gini if self.network_name == "Back" else gini
+
+        fitness = self.alpha * ability + self.beta * density + (1 - self.alpha - self.beta) * homo
+
+        ordered = np.sort(teams, axis=1)
+        fitness[(ordered[:, 1:] == ordered[:, :-1]).any(axis=1)] = -np.inf  # repeated players
+        if self.budget is not None:
+            fitness[self.salary[teams].sum(axis=1) > self.budget] = -np.inf
+
+        return fitness
+
+
+class Swarm:
+    """
+    PSO over teams of one network, with all the particles held in arrays
+
+    positions, velocities and pbest are (num_particles, team size) arrays and
+    pbest_fitness keeps the fitness of the personal bests, so every iteration
+    costs one batched fitness call for the whole swarm.
+    """
+
+    def __init__(self, fitness, num_particles, num_players, rng, w=1.0, c1=2.0, c2=2.0):
+        self.fitness = fitness
+        self.rng = rng
+        self.w = w
+        self.c1 = c1
+        self.c2 = c2
+        self.num_vertices = fitness.graph.numVertices
+
+        self.init_positions(num_particles, num_players)
+
+        self.pbest = self.positions.copy()  # Melhores posições pessoais
+        self.pbest_fitness = fitness(self.pbest)
+        best = np.argmax(self.pbest_fitness)
+        self.gbest = self.pbest[best].copy()
+        self.gbest_fitness = self.pbest_fitness[best]
+
+    def init_positions(self, num_particles, num_players):
+        self.positions = np.array([self.rng.choice(self.num_vertices, size=num_players, replace=False)
+                                   for _ in range(num_particles)])
+        self.velocities = self.rng.random((num_particles, num_players))  # Velocidades iniciais aleatórias
+
+    def move(self):
+        num_particles = len(self.positions)
+        r1 = self.rng.random((num_particles, 1))
+        r2 = self.rng.random((num_particles, 1))
+        self.velocities = self.w * self.velocities \
+                          + self.c1 * r1 * (self.pbest - self.positions) \
+                          + self.c2 * r2 * (self.gbest - self.positions)
+        self.positions = np.clip(self.positions + self.velocities, 0, self.num_vertices - 1).astype(np.int64)
+
+    def step(self):
+        """
+        Move every particle once and update pbest/gbest. Returns True if gbest improved
+        """
+        self.move()
+
+        fitness = self.fitness(self.positions)
+        improved = fitness > self.pbest_fitness
+        self.pbest[improved] = self.positions[improved]
+        self.pbest_fitness[improved] = fitness[improved]
+
+        return self.update_gbest()
+
+    def update_gbest(self):
+        best = np.argmax(self.pbest_fitness)
+        if self.pbest_fitness[best] > self.gbest_fitness:
+            self.gbest = self.pbest[best].copy()
+            self.gbest_fitness = self.pbest_fitness[best]
+            return True
+        return False
+
+    def diversity(self):
+        """
+        The average fraction of the players of each particle that are not in gbest
+        (0 when the whole swarm has collapsed onto gbest)
+        """
+        return 1 - np.isin(self.positions, self.gbest).mean()
+
+    def migrate(self, team, fitness):
+        """
+        Receive a team from another swarm: it replaces the particle with the worst personal best
+        """
+        worst = np.argmin(self.pbest_fitness)
+        self.positions[worst] = team
+        self.pbest[worst] = team
+        self.pbest_fitness[worst] = fitness
+        self.update_gbest()
+
+    def __getstate__(self):  # the fitness (and its network) is not pickled with the swarm
+        state = self.__dict__.copy()
+        state['fitness'] = None
+        return state
+
+
+class SetSwarm(Swarm):
+    """
+    Discrete PSO over player sets that only visits feasible teams
+
+    Each particle is a team laid out in slots, one slot per player required by
+    the position quotas (e.g. CB, CB, LB, RB), and a slot only ever holds a
+    player of the candidate pool of its position, so teams never repeat a
+    player nor break the quotas. The velocity is a set of swaps: in every
+    slot the particle swaps its player for the one of pbest (probability c1)
+    or of gbest (probability c2), and with probability mutation for a random
+    player of the pool.
+
+    slots gives the position group of each slot and slot_pools its candidates,
+    as returned by position_slots; every pool must hold at least as many
+    players as the slots of its group.
+    """
+
+    def __init__(self, fitness, num_particles, slots, slot_pools, rng, c1=0.3, c2=0.3, mutation=0.1):
+        self.slot_pools = slot_pools  # the candidate players of each slot
+        self.mutation = mutation
+        # slots of the same position group share the pool and are kept sorted, so that they line up between particles
+        self.blocks = []
+        start = 0
+        for end in range(1, len(slots) + 1):
+            if end == len(slots) or slots[end] != slots[start]:
+                self.blocks.append(slice(start, end))
+                start = end
+        super().__init__(fitness, num_particles, len(slot_pools), rng, c1=c1, c2=c2)
+
+    def init_positions(self, num_particles, num_players):
+        self.positions = np.zeros((num_particles, num_players), dtype=np.int64)
+        self.sample(np.ones(self.positions.shape, dtype=bool))
+        self.velocities = np.zeros((num_particles, num_players))  # not used: the moves are swaps
+
+    def sample(self, mask):
+        """
+        Draw new players for the slots in mask from their pools, then redraw until no team repeats a player
+        """
+        while mask.any():
+            for slot, pool in enumerate(self.slot_pools):
+                rows = np.flatnonzero(mask[:, slot])
+                self.positions[rows, slot] = pool[self.rng.integers(len(pool), size=len(rows))]
+            mask = self.repeated()
+        for block in self.blocks:
+            self.positions[:, block] = np.sort(self.positions[:, block], axis=1)
+
+    def repeated(self):
+        """
+        Mask of the slots that repeat a player already in an earlier slot of the same team
+        """
+        order = np.argsort(self.positions, axis=1, kind='stable')
+        ordered = np.take_along_axis(self.positions, order, axis=1)
+        mask = np.zeros(self.positions.shape, dtype=bool)
+        np.put_along_axis(mask, order[:, 1:], ordered[:, 1:] == ordered[:, :-1], axis=1)
+        return mask
+
+    def move(self):
+        r = self.rng.random(self.positions.shape)
+        to_pbest = r < self.c1
+        to_gbest = (r >= self.c1) & (r < self.c1 + self.c2)
+        target = np.where(to_pbest, self.pbest, np.where(to_gbest, self.gbest, self.positions))
+
+        # swap only towards players that are not in the team yet
+        in_team = (target[:, :, None] == self.positions[:, None, :]).any(axis=2)
+        self.positions = np.where(in_team, self.positions, target)
+        mutate = self.rng.random(self.positions.shape) < self.mutation
+        self.sample(mutate | self.repeated())
+
+    def __getstate__(self):  # neither are the candidate pools
+        state = super().__getstate__()
+        state['slot_pools'] = None
+        return state
+
+
+"""
+- Os grupos de posição (position_trans) e suas cotas para uma rede (Back ou Forward),
+    escolhidos pelo nome da rede (<network_quota>).
+- Retorna as vagas do time, uma por jogador exigido pela cota (ex.: CB, CB, LB, RB),
+    e o conjunto de candidatos (IDs) de cada vaga; vagas da mesma posição compartilham o mesmo array.
+- Gera ValueError se uma posição da rede tem menos jogadores que a sua cota (ou nenhum),
+    pois nenhum time viável existe (e o <SetSwarm> sortearia para sempre).
+"""
+def position_slots(pg, network_name, datasource):
+
+    graph = position_groups(pg, datasource)
+
+    slots = []
+    slot_pools = []
+    for code, (group, num) in network_quota(network_name, datasource).items():
+        pool = graph.group_members[code]
+        if len(pool) < num:
+            raise ValueError("the position %s needs %d players but the network has only %d"
+                             % (group, num, len(pool)))
+        slots.extend([group] * num)
+        slot_pools.extend([pool] * num)
+
+    return slots, slot_pools
+
+
+"""
+- Calcula uma única vez, por rede e conjunto de dados, o grupo de posição de cada jogador.
+- <position_trans> é aplicada somente à tabela das posições distintas da rede; o resultado
+    vira o array inteiro group_code (índice do grupo em <get_position_num>, -1 se fora das cotas)
+    e o índice group_members (grupo -> IDs dos jogadores), guardados na própria rede.
+- Assim a filtragem de candidatos por posição vira uma máscara sobre arrays.
+- Retorna a rede (players.ArrayGraph).
+"""
+def position_groups(pg, datasource):
+
+    graph = players.as_array_graph(pg)
+    if getattr(graph, 'group_datasource', None) != datasource:
+        group_names = list(get_position_num(datasource))
+        groups = [position_trans(name, datasource) for name in graph.position_names.tolist()]
+        position_group = [group_names.index(group) if group in group_names else -1 for group in groups]
+        graph.set_groups(group_names, position_group, datasource)
+
+    return graph
+
+
+# Máscara dos candidatos (array de IDs) cujo grupo de posição ainda tem vaga; quota é indexada pelo código do grupo.
+def open_position_mask(graph, candidates, quota):
+    group = graph.group_code[candidates]
+    mask = np.zeros(len(candidates), dtype=bool)
+    mask[group >= 0] = quota[group[group >= 0]] > 0
+    return mask
+
 """
  Calcula a habilidade de um jogador ponderando suas habilidades
   individuais pelos critérios de avaliação.
@@ -147,6 +547,36 @@ def cal_player_ability(abilities, criteria, abi_name_id):
     return player_ability
 
 
+"""
+- Converte os critérios de avaliação (de <read_criteria>) em um vetor denso de pesos,
+    alinhado às colunas da matriz de habilidades da rede (ability_ids).
+- Habilidades sem critério recebem peso 0.
+"""
+def criteria_vector(criteria, abi_name_id, ability_ids):
+    abi_id_name = {abi_id: name for name, abi_id in abi_name_id.items()}
+    return np.array([criteria.get(abi_id_name[abi_id], 0) for abi_id in ability_ids])
+
+
+_players_ability = weakref.WeakKeyDictionary()  # network : {criteria : abilities of all players}
+
+"""
+- Calcula a habilidade (<cal_player_ability>) de todos os jogadores da rede de uma vez,
+    com um único produto matriz-vetor entre a matriz de habilidades e o vetor de critérios.
+- O resultado é guardado por (rede, critérios), de modo que o guloso, o PSO e a poda
+    reutilizam os mesmos valores. Retorna um array (somente leitura, pois é compartilhado)
+    indexado pelo número do jogador.
+"""
+def cal_players_ability(network, criteria, abi_name_id):
+    graph = players.as_array_graph(network)
+    cache = _players_ability.setdefault(graph, {})
+    key = tuple(sorted(criteria.items()))
+    if key not in cache:
+        abilities = graph.abilities @ criteria_vector(criteria, abi_name_id, graph.ability_ids)
+        abilities.flags.writeable = False  # callers must copy before changing it
+        cache[key] = abilities
+    return cache[key]
+
+
 """
 Calcula o grau de um jogador (número de conexões no grafo).
 """
@@ -158,18 +588,12 @@ def cal_player_degree(player_co):
 """
 Seleciona os jogadores da equipe iterativamente.
 """
-def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, alpha, beta, star, network_name, datasource, k=1):
+def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, alpha, beta, star, network_name, datasource, k=1, verbose=True):
 
     # the number of players in each position
-    if datasource == 'PES':
-        position_num = {"CB": 2, "LB": 1, "RB": 1, "CF/SS": 1, "LWF": 1, "RWF": 1, "*MF": 3}
-    elif datasource == 'FIFA':
-        position_num = {"CB": 2, "LB": 1, "RB": 1, "MID": 3, "FOR": 3}
+    position_num = get_position_num(datasource)
 
-    opt_players = select_opt_players(player_no_id, pg.vertexList, criteria, abi_name_id,
-                                          alpha, beta, network_name, datasource)
-
-    #opt_players = list()  # initialize the optimal player set
+    opt_players = list()  # initialize the optimal player set
     opt_players_position = {}  # initialize the position
 
     opt_players.append(star)  # add the centre player
@@ -180,67 +604,38 @@ def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, al
     if network_name == "Forward":
         threshold = 6
 
+    abilities = cal_players_ability(vertex_list, criteria, ability_name_id)  # personal abilities
+
+    stats = players.TeamStats(vertex_list, opt_players)  # ability statistics of opt_players
+    frontier = Frontier(vertex_list, abilities, datasource)  # neighbors of opt_players
+    frontier.add(star)
+
     while k < threshold:
-        # get all neighbors of opt_players
-        neighbor = list()
-        for player in opt_players:
-            for key in vertex_list[player].connectedTo.keys():
-                if key.id not in neighbor and key.id not in opt_players and \
-                   position_num[position_trans(key.position, datasource)] != 0:
-                    neighbor.append(key.id)
+        # the neighbors of opt_players in the positions still open
+        neighbor = frontier.candidates(position_num)
+        if len(neighbor) == 0:
+            break  # no player can be added to the team
 
         # function = ability + density + homogeneity
-        density = {}
-        team_ability = {}
-        team_gini = {}
-        team_homo = {}
-        for ne in neighbor:  # walk through all neighbors
-            # calculate the personal ability of neighbor
-            ne_abi = cal_player_ability(vertex_list[ne].abilities, criteria, ability_name_id)
-            # calculate the weights and abilities of neighbor with opt_players
-            weight = 0
-            te_abi = ne_abi
-            for op in opt_players:
-                if vertex_list[op] in vertex_list[ne].connectedTo:
-                    # cumulate the weight
-                    weight += vertex_list[ne].get_weight(vertex_list[op])
-                    # cumulate the team ability
-                    te_abi += cal_player_ability(vertex_list[op].abilities, criteria, ability_name_id)
-
-            # calculate the Gini coefficient
-            gini = cal_homogeneity(vertex_list, ne, opt_players)
-
-            d = weight / (len(opt_players)+1)  # calculate the density
-            density[ne] = d
-            team_ability[ne] = te_abi
-            team_gini[ne] = gini
+        density = frontier.weight[neighbor] / (len(opt_players)+1)  # calculate the density
+        team_ability = abilities[neighbor] + frontier.ability[neighbor]
+        team_gini = stats.gini_add(neighbor)  # calculate the Gini coefficient
 
         if network_name == "Back":
-            for key, value in team_gini.items():
-                team_homo[key] = 1/value  # homogeneity
+            team_homo = 1/team_gini  # homogeneity
         elif network_name == "Forward":
-            for key, value in team_gini.items():
-                team_homo[key] = value  # heterogeneity
+            team_homo = team_gini  # heterogeneity
 
         # find the best player with maximum team ability + density + homogeneity
-        score_max = 0
-        candidate = None
-        team_ability_nor = normalize_min_max(team_ability)  # normalize the team ability
-        # density_nor = normalize_min_max(density)
-        team_homo_nor = normalize_min_max(team_homo)  # normalize the heterogeneity
-
-        for player_id, value in team_ability_nor.items():
-            # score = abilities + density + homogeneity
-            score = alpha * team_ability_nor[player_id] + \
-                    beta * density[player_id] + \
-                    (1-alpha-beta) * (team_homo_nor[player_id])
-
-            if score_max < score:
-                score_max = score
-                candidate = player_id
+        team_ability_nor = normalize_min_max_array(team_ability)  # normalize the team ability
+        team_homo_nor = normalize_min_max_array(team_homo)  # normalize the heterogeneity
+        score = alpha * team_ability_nor + beta * density + (1-alpha-beta) * team_homo_nor
+        candidate = int(neighbor[np.argmax(score)])
 
         # add the best player
         opt_players.append(candidate)
+        stats.add(candidate)
+        frontier.add(candidate)
         update_position(position_num, vertex_list[candidate].position, datasource)
         opt_players_position[player_num_id[candidate]] = vertex_list[candidate].position
 
@@ -251,11 +646,409 @@ def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, al
     for player_id in opt_players:
         opt_players_real.append(player_num_id[player_id])
 
-    print("The best players are:", opt_players_real)
-    print("The positions of each players are:", opt_players_position)
+    if verbose:
+        print("The best players are:", opt_players_real)
+        print("The positions of each players are:", opt_players_position)
+
+    return opt_players
+
+class Frontier:
+    """
+    The neighbors of a team, maintained incrementally while players are added
+
+    Only the neighbors of the newly added player are visited. For every player
+    it keeps the accumulated weight to the team and the accumulated personal
+    ability of the team members connected to it, and candidates are indexed by
+    position group code (position_groups), so the greedy step needs no rescan of the team.
+    """
+
+    def __init__(self, pg, abilities, datasource):
+        self.graph = position_groups(pg, datasource)
+        self.abilities = abilities
+        n = self.graph.numVertices
+        self.weight = np.zeros(n)  # sum of the weights between each player and the team
+        self.ability = np.zeros(n)  # sum of the abilities of the team members connected to each player
+        self.seen = np.zeros(n, dtype=bool)  # in the team or in the frontier
+        self.members = [set() for _ in self.graph.group_names]  # position group code : set of candidate ids
+
+    def add(self, player):
+        """
+        Add a player to the team and its neighbors to the frontier
+        """
+        group = self.graph.group_code[player]
+        if group >= 0:
+            self.members[group].discard(player)
+        self.seen[player] = True
+
+        neighbor = self.graph.neighbors(player)
+        self.weight[neighbor] += self.graph.pair_weights(np.full(len(neighbor), player), neighbor)
+        self.ability[neighbor] += self.abilities[player]
+
+        new = neighbor[~self.seen[neighbor]]
+        self.seen[new] = True
+        new_group = self.graph.group_code[new]
+        for group in np.unique(new_group[new_group >= 0]).tolist():
+            self.members[group].update(new[new_group == group].tolist())
+
+    def candidates(self, position_num):
+        """
+        The sorted ids of the frontier players whose position is still open
+        """
+        open_groups = [self.members[code] for code, num in enumerate(position_num.values()) if num > 0]
+        return np.array(sorted(set().union(*open_groups)), dtype=np.int64)
+
+
+"""
+- Versão em feixe (beam search) de <select_opt_players>.
+- Em vez de um único caminho guloso, mantém os beam_width melhores times parciais. A cada passo:
+  --> Expande cada time do feixe com todos os vizinhos cujas posições ainda têm vaga.
+  --> Elimina os times repetidos (o mesmo conjunto de jogadores vindo de feixes diferentes).
+  --> Avalia todos os times expandidos de uma vez com <TeamFitness> e mantém os beam_width melhores.
+- beam_width=1 equivale a um guloso sobre o fitness do time; valores maiores trocam
+    latência por qualidade, até a busca exaustiva.
+- Retorna None se o time não pode ser completado (nenhum time do feixe tem vizinhos
+    nas posições com vaga); gera ValueError se a posição da estrela não tem cota.
+- cache: Opcional, o cache de times da rede (<modules.team_cache>), útil ao repetir a busca
+    para várias estrelas, que voltam a avaliar os mesmos times.
+"""
+def select_opt_players_beam(player_num_id, vertex_list, criteria, ability_name_id, alpha, beta, star, network_name, datasource, beam_width=4, verbose=True,
+                            cache=None):
+
+    graph = position_groups(vertex_list, datasource)
+    fitness = TeamFitness(graph, criteria, ability_name_id, alpha, beta, network_name, cache=cache)
+
+    quota = np.array(list(get_position_num(datasource).values()))  # indexed by the position group code
+    if graph.group_code[star] < 0:
+        raise ValueError("the position %s of the star %d has no quota in %s"
+                         % (vertex_list[star].position, star, datasource))
+    quota[graph.group_code[star]] -= 1
+
+    threshold = 4  # the maximum number of players to be selected
+    if network_name == "Forward":
+        threshold = 6
+
+    beam = [(np.array([star], dtype=np.int64), quota)]
+    for _ in range(threshold - 1):
+        teams = []
+        parents = []
+        for b, (team, quota) in enumerate(beam):
+            frontier = graph.team_neighbors(team)
+            frontier = frontier[open_position_mask(graph, frontier, quota)]
+            teams.append(np.column_stack((np.repeat(team[None, :], len(frontier), axis=0), frontier)))
+            parents.append(np.full(len(frontier), b))
+
+        teams = np.vstack(teams)
+        if len(teams) == 0:  # the team cannot be completed
+            if verbose:
+                print("The team of the star %d cannot be completed" % player_num_id[star])
+            return None
+        parents = np.concatenate(parents)
+
+        # the same player set reached from different teams is kept once
+        _, first = np.unique(np.sort(teams, axis=1), axis=0, return_index=True)
+        teams = teams[first]
+        parents = parents[first]
+
+        team_fitness = fitness(teams)
+        best = np.argsort(-team_fitness, kind='stable')[:beam_width]
+        expanded = []
+        for i in best.tolist():
+            quota = beam[parents[i]][1].copy()
+            quota[graph.group_code[teams[i][-1]]] -= 1
+            expanded.append((teams[i], quota))
+        beam = expanded
+
+    opt_players = beam[0][0].tolist()
+
+    # get the player ID and the positions
+    opt_players_real = [player_num_id[player_id] for player_id in opt_players]
+    opt_players_position = {player_num_id[player_id]: vertex_list[player_id].position for player_id in opt_players}
+
+    if verbose:
+        print("The best players are:", opt_players_real)
+        print("The positions of each players are:", opt_players_position)
 
     return opt_players
 
+"""
+- Poda por dominância dos candidatos de um grupo de posição, antes do <player_opt_subgraph_exact>.
+- O candidato i domina j se não é mais caro (salário) e se trocar j por i em qualquer time
+    de m jogadores não diminui o fitness: o ganho de habilidade pessoal cobre a maior perda possível
+  --> de densidade: os m-1 maiores pesos de j (nenhuma perda se i e j são da mesma classe de uma players.ClassGraph);
+  --> de homogeneidade: o Gini de cada critério muda no máximo 2(m-1)|x_i - x_j| / (m^2 * lo),
+        lo sendo a menor habilidade do critério entre os candidatos da rede.
+- j é descartado se ao menos num (a cota do grupo) candidatos mantidos o dominam: num time ótimo
+    com j um deles fica livre para trocar de lugar com j, então sempre há um time ótimo sem os descartados.
+- Retorna o grupo sem os dominados, ordenado pelo salário.
+"""
+def undominated_players(fitness, pool, num, m, lo, max_weights, player_class=None):
+
+    order = np.lexsort((-fitness.abilities[pool], fitness.salary[pool]))  # salary, then ability from the best
+    pool = pool[order]
+    if (lo <= 0).any():  # the Gini cannot be bounded
+        return pool
+
+    gain = fitness.alpha * fitness.abilities[pool] / (m * fitness.ability_max)
+    weight_loss = abs(fitness.beta) * (m - 1) * max_weights[pool] / (m * (m - 1) / 2)
+    rows = fitness.matrix[pool] * (abs(1 - fitness.alpha - fitness.beta) * 2 * (m - 1) / (m * m * lo)) / len(lo)
+    classes = None if player_class is None else player_class[pool]
+
+    kept = np.zeros(len(pool), dtype=np.int64)  # the positions (in pool) of the kept candidates
+    num_kept = 0
+    for j in range(len(pool)):
+        i = kept[:num_kept]  # all of them at most as expensive as j
+        loss = weight_loss[j] if classes is None else np.where(classes[i] == classes[j], 0, weight_loss[j])
+        margin = gain[i] - gain[j] - loss - np.abs(rows[i] - rows[j]).sum(axis=1)
+        if np.count_nonzero(margin >= 0) < num:
+            kept[num_kept] = j
+            num_kept += 1
+
+    return pool[kept[:num_kept]]
+
+
+"""
+- Solução exata (branch and bound) do objetivo de <TeamFitness> para uma rede (Back ou Forward),
+    respeitando as cotas de posição da rede (<network_quota>) e, se dado, o orçamento da linha
+    (soma dos salários <= budget). Serve de referência para medir a distância do guloso,
+    do feixe e do PSO até o ótimo.
+- Gera ValueError se uma posição da rede tem menos jogadores que a sua cota (ou nenhum).
+- Antes da busca, os candidatos dominados de cada grupo são descartados (<undominated_players>).
+- As vagas são preenchidas grupo a grupo; dentro de um grupo os candidatos são ordenados
+    pelo salário e escolhidos em ordem crescente, então cada time é visitado uma única vez.
+- Em cada nó, todos os filhos são avaliados de uma vez:
+  --> Orçamento: custo parcial + salário do candidato + os salários mais baratos ainda possíveis
+        para as vagas restantes; como os candidatos estão ordenados pelo salário, os inviáveis
+        são um sufixo da lista e são descartados de uma vez.
+  --> Limite superior: habilidade e densidade parciais, mais, para cada vaga restante, os melhores
+        jogadores ainda disponíveis no seu grupo pela sua habilidade somada aos seus pesos até o time
+        parcial e até o candidato, mais o maior peso ainda disponível em cada par entre as vagas restantes,
+        e a maior homogeneidade possível dado o Gini parcial e a faixa de habilidades
+        dos jogadores ainda disponíveis. O peso até o candidato é primeiro limitado pelo maior peso
+        de cada jogador; só os filhos que passam são limitados com os pesos exatos.
+        Filhos com limite não maior que o melhor time encontrado são podados.
+  --> Os filhos são expandidos do maior para o menor limite, para achar bons times cedo.
+- incumbent: Um time inicial (IDs dos vértices), ex.: o do guloso, que acelera a poda.
+    Só é usado se respeita as cotas de posição e o orçamento; senão é ignorado.
+- deadline: Tempo de relógio, em segundos; se esgotado, retorna o melhor time encontrado
+    e stats['optimal'] é False.
+- max_nodes: Número máximo de nós expandidos; se atingido, idem.
+- Retorna:
+--> opt_players: IDs dos jogadores do melhor time (None se nenhum time cabe no orçamento).
+--> fitness: O fitness do melhor time.
+--> stats: Candidatos dominados, nós expandidos, times completos avaliados, filhos gerados, podas por limite
+        e por orçamento (e as respectivas taxas), tempo decorrido e se o ótimo foi provado.
+"""
+def player_opt_subgraph_exact(player_no_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource,
+                              budget=None, incumbent=None, deadline=None, max_nodes=None):
+
+    start = time.perf_counter()
+    graph = position_groups(pg, datasource)
+    fitness = TeamFitness(graph, criteria, abi_name_id, alpha, beta, network_name, budget=budget)
+    abilities = fitness.abilities
+    salary = fitness.salary
+    matrix = graph.abilities
+    max_weights = graph.max_weights()
+
+    # the groups of the network and their candidates
+    pools = []
+    quotas = []
+    group_quota = np.zeros(len(graph.group_members), dtype=np.int64)  # group code : number of slots
+    for code, (group, num) in network_quota(network_name, datasource).items():
+        pool = graph.group_members[code]
+        if len(pool) < num:
+            raise ValueError("the position %s needs %d players but the network has only %d"
+                             % (group, num, len(pool)))
+        pools.append(pool)
+        quotas.append(num)
+        group_quota[code] = num
+
+    m = sum(quotas)  # team size
+    num_pairs = m * (m - 1) / 2
+    homo_max = 1 if network_name == "Back" else (m - 1) / m
+    budget_max = np.inf if budget is None else budget
+
+    # drop the dominated candidates, the others are sorted by salary
+    lo = matrix[np.concatenate(pools)].min(axis=0)
+    player_class = getattr(graph, 'player_class', None)
+    size = sum(len(pool) for pool in pools)
+    pools = [undominated_players(fitness, pool, num, m, lo, max_weights, player_class)
+             for pool, num in zip(pools, quotas)]
+    everyone = np.concatenate(pools)
+
+    # the bound of a player in a later slot: its ability plus its weights to the team
+    value = alpha * abilities / (m * fitness.ability_max)
+    edge = beta / num_pairs
+
+    # per group: cumulative salaries and the suffix maxima of edge weight
+    cum_salary = [np.concatenate(([0], np.cumsum(salary[pool]))) for pool in pools]
+    weight_suffix = [np.concatenate((np.maximum.accumulate(max_weights[pool][::-1])[::-1], [0])) for pool in pools]
+
+    # the bounds of the groups after each group, which are still untouched
+    num_groups = len(pools)
+    cost_later = np.zeros(num_groups + 1)
+    weight_later = np.zeros(num_groups + 1)
+    hi_from = np.full((num_groups + 1, matrix.shape[1]), -np.inf)  # ability ranges of the groups from g on
+    lo_from = np.full((num_groups + 1, matrix.shape[1]), np.inf)
+    for g in range(num_groups - 1, -1, -1):
+        cost_later[g] = cost_later[g+1] + cum_salary[g][quotas[g]]
+        weight_later[g] = max(weight_later[g+1], weight_suffix[g][0])
+        hi_from[g] = np.maximum(hi_from[g+1], matrix[pools[g]].max(axis=0))
+        lo_from[g] = np.minimum(lo_from[g+1], matrix[pools[g]].min(axis=0))
+
+    # the slots: (group, number of slots left in the same group after it)
+    slots = [(g, quotas[g] - 1 - j) for g in range(num_groups) for j in range(quotas[g])]
+
+    stats = {'dominated': size - len(everyone), 'nodes': 0, 'leaves': 0, 'generated': 0,
+             'pruned_bound': 0, 'pruned_budget': 0, 'optimal': True}
+    best = {'team': None, 'fitness': -np.inf}
+    if incumbent is not None:
+        incumbent = np.asarray(incumbent, dtype=np.int64)
+        groups = graph.group_code[incumbent]
+        if len(np.unique(incumbent)) == m and (groups >= 0).all() and \
+                (np.bincount(groups, minlength=len(group_quota)) == group_quota).all():
+            incumbent_fitness = fitness.evaluate([incumbent])[0]
+            if np.isfinite(incumbent_fitness):  # -inf over the budget
+                best['team'] = incumbent.tolist()
+                best['fitness'] = incumbent_fitness
+
+    # the sum of the k best values of each row over the columns from first[row] on
+    def top(values, k, first=None):
+        if first is not None:
+            values = np.where(np.arange(values.shape[1]) >= first[:, None], values, -np.inf)
+        return np.partition(values, values.shape[1] - k, axis=1)[:, values.shape[1] - k:].sum(axis=1)
+
+    # link: the sum of the weights between each player and the team
+    def expand(team, link, slot, first, cost, ability, weight, diff, total):
+        if (deadline is not None and time.perf_counter() - start > deadline) or \
+                (max_nodes is not None and stats['nodes'] >= max_nodes):
+            stats['optimal'] = False
+            return
+        stats['nodes'] += 1
+
+        g, rest = slots[slot]
+        pool = pools[g]
+        ranks = np.arange(first, len(pool) - rest)  # leave room for the rest of the group
+        cand = pool[ranks]
+        stats['generated'] += len(cand)
+
+        # budget: the cheapest completion of each child
+        cand_cost = cost + salary[cand]
+        cheapest = cand_cost + cum_salary[g][ranks + 1 + rest] - cum_salary[g][ranks + 1] + cost_later[g+1]
+        feasible = np.searchsorted(cheapest, budget_max, side='right')  # increasing along the ranks
+        stats['pruned_budget'] += len(cand) - int(feasible)
+        ranks, cand, cand_cost = ranks[:feasible], cand[:feasible], cand_cost[:feasible]
+        if len(cand) == 0:
+            return
+
+        cand_ability = ability + abilities[cand]
+        cand_weight = weight + link[cand]
+
+        if slot == m - 1:  # the children are complete teams
+            teams = np.column_stack([np.repeat([team], len(cand), axis=0).reshape(len(cand), len(team)), cand])
+            team_fitness = fitness.evaluate(teams)
+            stats['leaves'] += len(cand)
+            i = int(np.argmax(team_fitness))
+            if team_fitness[i] > best['fitness']:
+                best['team'] = teams[i].tolist()
+                best['fitness'] = team_fitness[i]
+            return
+
+        # upper bound of each child
+        size = len(team) + 1
+        left = m - size  # players still to be chosen
+        free_pairs = left * (left - 1) / 2  # the pairs among them
+        free_weight = np.maximum(np.where(rest > 0, weight_suffix[g][ranks + 1], 0), weight_later[g+1])
+
+        # Gini of each child (sum of |x_i - x_j| over ordered pairs and sum of x, per ability),
+        # bounded with the ability range of the players still available
+        rows = matrix[team]
+        cand_rows = matrix[cand]
+        cand_diff = diff + 2 * np.abs(cand_rows[:, None, :] - rows[None, :, :]).sum(axis=1)
+        cand_total = total + cand_rows
+        hi, lo = hi_from[g], lo_from[g]
+        if network_name == "Back":  # the rest adds no difference and at most hi to the sums
+            homo_bound = 1 - (cand_diff / (2 * m * (cand_total + left * hi))).mean(axis=1)
+        else:  # the rest adds at most the farthest value of the range to each pair and at least lo to the sums
+            spread = np.maximum(hi - rows, rows - lo).sum(axis=0) + np.maximum(hi - cand_rows, cand_rows - lo)
+            gini_bound = (cand_diff + 2 * left * spread + left * (left - 1) * (hi - lo)) / \
+                         (2 * m * (cand_total + left * lo))
+            homo_bound = np.minimum(gini_bound.mean(axis=1), homo_max)
+
+        partial = alpha * cand_ability / m / fitness.ability_max + edge * (cand_weight + free_pairs * free_weight) + \
+                  (1 - alpha - beta) * homo_bound
+
+        # the players still available for the later slots: the rest of this group and the later groups
+        later = [(pools[h], quotas[h]) for h in range(g + 1, num_groups)]
+        own = pool[first:]
+
+        # first with the largest weight of each player to the child
+        bound = partial.copy()
+        for players_left, num in later:
+            bound += top((value[players_left] + edge * (link[players_left] + max_weights[players_left]))[None, :], num)
+        if rest > 0:
+            best_own = np.maximum.accumulate((value[own] + edge * (link[own] + max_weights[own]))[::-1])[::-1]
+            bound += rest * best_own[ranks - first + 1]
+        alive = np.flatnonzero(bound > best['fitness'])
+        stats['pruned_bound'] += len(cand) - len(alive)
+        if len(alive) == 0:
+            return
+
+        # then with the exact weights to the child
+        bound = partial[alive]
+        for players_left, num in later:
+            weights = graph.pair_weights(cand[alive][:, None], players_left[None, :])
+            bound += top(value[players_left] + edge * (link[players_left] + weights), num)
+        if rest > 0:
+            weights = graph.pair_weights(cand[alive][:, None], own[None, :])
+            bound += top(value[own] + edge * (link[own] + weights), rest, ranks[alive] - first + 1)
+
+        order = np.argsort(-bound, kind='stable').tolist()
+        for i, c in enumerate(order):
+            if bound[c] <= best['fitness']:  # and so are the bounds of the next children
+                stats['pruned_bound'] += len(order) - i
+                break
+            c = alive[c]
+            child_link = link.copy()
+            child_link[everyone] += graph.pair_weights(np.full(len(everyone), cand[c]), everyone)
+            expand(team + [int(cand[c])], child_link, slot + 1, ranks[c] + 1 if rest > 0 else 0,
+                   cand_cost[c], cand_ability[c], cand_weight[c], cand_diff[c], cand_total[c])
+            if not stats['optimal']:
+                return
+
+    expand([], np.zeros(graph.numVertices), 0, 0, 0, 0, 0, np.zeros(matrix.shape[1]), np.zeros(matrix.shape[1]))
+
+    stats['elapsed'] = time.perf_counter() - start
+    generated = max(stats['generated'], 1)
+    stats['bound_prune_rate'] = stats['pruned_bound'] / generated
+    stats['budget_prune_rate'] = stats['pruned_budget'] / generated
+
+    opt_players = None if best['team'] is None else [player_no_id[i] for i in best['team']]
+
+    return opt_players, best['fitness'], stats
+
+"""
+Número de jogadores de cada posição (após <position_trans>) no time, sem o goleiro.
+"""
+def get_position_num(datasource):
+    if datasource == 'PES':
+        position_num = {"CB": 2, "LB": 1, "RB": 1, "CF/SS": 1, "LWF": 1, "RWF": 1, "*MF": 3}
+    elif datasource == 'FIFA':
+        position_num = {"CB": 2, "LB": 1, "RB": 1, "MID": 3, "FOR": 3}
+
+    return position_num
+
+"""
+As cotas de <get_position_num> que cabem a uma rede: CB, LB e RB à defesa (Back),
+as demais ao ataque/meio-campo (Forward).
+Retorna {código do grupo (índice em <get_position_num>): (grupo, número de jogadores)}.
+"""
+def network_quota(network_name, datasource):
+    back = network_name == "Back"
+    return {code: (group, num) for code, (group, num) in enumerate(get_position_num(datasource).items())
+            if (group in BACK_GROUPS) == back}
+
+BACK_GROUPS = ("CB", "LB", "RB")  # the position groups of the Back network
+
 """
 Atualiza o número de jogadores disponíveis para cada posição.
 """
@@ -293,8 +1086,17 @@ def position_trans(player_position, datasource):
 """
 Calcula a homogeneidade (ou heterogeneidade, dependendo do tipo de rede)
   de um conjunto de jogadores usando o índice de Gini.
+- cache: Opcional, o cache de times da rede (<modules.team_cache>); sem ele, o Gini é sempre calculado.
 """
-def cal_homogeneity(vertex_list, neighbor, opt_players):
+def cal_homogeneity(vertex_list, neighbor, opt_players, cache=None):
+    if cache is None:
+        return cal_homogeneity_dict(vertex_list, neighbor, opt_players)
+    key = modules.team_key('gini', None, None, [neighbor] + list(opt_players))
+    return cache.lookup(key, lambda: cal_homogeneity_dict(vertex_list, neighbor, opt_players))
+
+
+# <cal_homogeneity> sem cache, sobre os dicionários de habilidades dos jogadores.
+def cal_homogeneity_dict(vertex_list, neighbor, opt_players):
 
     homo = 0
     com_players = list()
@@ -311,7 +1113,7 @@ def cal_homogeneity(vertex_list, neighbor, opt_players):
     # calculate the difference of ability between players
     for i in range(0, len(com_players)):
         for j in range(0, len(com_players)):
-            for abi_id in vertex_list[i].abilities.keys():
+            for abi_id in vertex_list[com_players[i]].abilities.keys():
                 d = abs(vertex_list[com_players[i]].abilities[abi_id] -
                         vertex_list[com_players[j]].abilities[abi_id])
                 if abi_id not in diff:
@@ -343,6 +1145,30 @@ def cal_homogeneity(vertex_list, neighbor, opt_players):
     return homo
 
 
+"""
+- Versão em lote de <cal_homogeneity>: calcula de uma vez o coeficiente de Gini do time
+    opt_players + candidato para todos os candidatos (array de IDs).
+- As somas do time são calculadas uma vez (players.TeamStats) e só a parte
+    candidato x time é calculada para cada candidato, com broadcasting.
+- Retorna um array com o Gini médio (sobre as habilidades) de cada candidato.
+- cache: Opcional, o cache de times da rede (<modules.team_cache>); só os candidatos
+    cujo time ainda não está no cache são calculados.
+"""
+def cal_homogeneity_batch(network, opt_players, candidates, cache=None):
+    if cache is None:
+        return players.TeamStats(network, opt_players).gini_add(candidates)
+
+    candidates = np.asarray(candidates, dtype=np.int64)
+    keys = [modules.team_key('gini', None, None, [c] + list(opt_players)) for c in candidates.tolist()]
+    gini = np.array([cache.get(key, np.nan) for key in keys])
+    missing = np.flatnonzero(np.isnan(gini))
+    if len(missing):
+        gini[missing] = players.TeamStats(network, opt_players).gini_add(candidates[missing])
+        for i in missing.tolist():
+            cache.put(keys[i], gini[i])
+    return gini
+
+
 def normalize(dict_type):
     total = sum(v for v in dict_type.values())
     tmp = {}
@@ -350,6 +1176,12 @@ def normalize(dict_type):
         tmp[key] = value / total
     return tmp
 
+# Normaliza os valores de um array entre 0 e 1 (versão vetorizada de <normalize_min_max>).
+def normalize_min_max_array(values):
+    value_range = (values.max()-values.min()) or 1  # all values equal (e.g. a single one)
+    return (values-values.min())/value_range
+
+
 """
 Normaliza os valores de um dicionário entre 0 e 1.
 """
@@ -364,8 +1196,9 @@ def normalize_min_max(dict_type):
         if value < value_min:
             value_min = value
 
+    value_range = (value_max-value_min) or 1  # all values equal (e.g. a single one)
     tmp = {}
     for key, value in dict_type.items():
-        tmp[key] = (value-value_min)/(value_max-value_min)
+        tmp[key] = (value-value_min)/value_range
 
     return tmp
\ No newline at end of file
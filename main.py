@@ -10,22 +10,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.getcwd()))
 sys.path.append(BASE_DIR)
 sys.path.append('TCFPACN')
 
-from FBTP import PESpre, FIFApre, fbtp, modules, greedy  # Importa módulos personalizados para o modelo
-import pickle             # Serialização de objetos Python
-import logging            # Registro de eventos e mensagens
-
-# Funções para salvar e carregar parâmetros
-def save(filepath, params):
-    with open(filepath, 'wb') as file:
-        pickle.dump(params, file) # Salva parâmetros em um arquivo usando pickle
-        logging.info("save parameters to %s" % filepath)
-
-# Carrega parâmetros de um arquivo usando pickle
-def load(filepath):
-    with open(filepath, 'rb') as file:
-        params = pickle.load(file).values()
-        logging.info("load parameters from %s" % filepath)
-        return params
+from FBTP import fbtp, modules, greedy, dataset, players  # Importa módulos personalizados para o modelo
 
 # Função para redirecionar a saída para um arquivo de log
 def out_to_file(path, model_name): # Cria um objeto logger para escrever em arquivo e no terminal
@@ -46,11 +31,37 @@ def out_to_file(path, model_name): # Cria um objeto logger para escrever em arqu
     sys.stdout = logger(model_name + '.log', path=path)
 
 
+# Constrói (ou carrega do cache de etapas) a rede de jogadores de defesa ou de ataque/meio-campo
+# a partir da PlayerTable da rede. A similaridade esparsa só é calculada (ou carregada) quando a rede não está no cache;
+# ambas são guardadas como arrays .npz (<dataset.StageCache>).
+def network(cache, network_name, info_key, compressed, table):
+
+    # the code of each stage: the modules of the functions and classes it uses
+    construction = [players.ArrayGraph, dataset.PlayerTable]
+    if compressed:  # the class network computes its own similarity
+        return cache.run('players_graph_construction', greedy.players_graph_construction_compressed_table,
+                         (network_name, table), inputs=[info_key], params=(network_name,),
+                         functions=construction + [modules.cal_class_similarity])[0]
+
+    sim_key = cache.key('cal_similarity', [modules.cal_similarity_sparse], inputs=[info_key], params=(network_name,))
+    key = cache.key('players_graph_construction', [greedy.players_graph_construction_table] + construction,
+                    inputs=[info_key, sim_key], params=(network_name,))
+    if cache.has(key):
+        return cache.load(key)
+
+    sim, _ = cache.run('cal_similarity', modules.cal_similarity_sparse, (network_name, table.attributes()),
+                       inputs=[info_key], params=(network_name,))  # calculate the (sparse) similarity
+    pg = greedy.players_graph_construction_table(network_name, table, sim)
+    cache.save(key, pg)
+    return pg
+
+
 # Início do programa principal
 if __name__ == '__main__':
 
     DATASET = 'PES'  # Escolha do conjunto de dados (PES ou FIFA)
     #DATASET = 'FIFA'  # Escolha do conjunto de dados (PES ou FIFA)
+    COMPRESSED = False  # Rede comprimida por classes [clube, nacionalidade] (players.ClassGraph)
 
     # Configurações específicas para cada conjunto de dados (arquivos, parâmetros)
     if DATASET == 'PES':
@@ -66,49 +77,7 @@ if __name__ == '__main__':
         BUDGET = 100
 
         FILE_PATH = 'TCFPACN'+'/Data/'+DATASET+'/'
-        cri_back = PESpre.read_criteria(FILE_PATH, CRITERIA_BACK)  # read the backward criteria
-        cri_forward = PESpre.read_criteria(FILE_PATH, CRITERIA_FORWARD)  # read the forward/midfielder criteria
-
-        # 1: the Goalkeepers
-        gks = PESpre.get_goalkeepers(FILE_PATH, FILE_GOALKEEPER)  # get all goalkeepers
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/Goalkeepers', {'gks':gks})
-        gks = next(iter(load("TCFPACN"+ "/FBTP/params/" + DATASET + '/Goalkeepers')))
-
-        # 2: the Back network
-        abi_name_id, p_attrs_back, p_abis_name_back, p_pos_back, p_r_back, p_no_id_back = \
-        PESpre.read_info(FILE_PATH, FILE_BACK)  # read backwards information
-        sim_back = modules.cal_similarity('Back', p_attrs_back)  # calculate the similarity
-
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/info_back', {'abi_name_id':abi_name_id, 'p_attrs_back':p_attrs_back, 'p_abis_name_back':p_abis_name_back,'p_pos_back':p_pos_back, 'p_r_back':p_r_back, 'p_no_id_back':p_no_id_back}
-            )
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/sim_back', {'sim_back':sim_back})
-        abi_name_id, p_attrs_back, p_abis_name_back, p_pos_back, p_r_back, p_no_id_back = \
-            load("TCFPACN"+ "/FBTP/params/" + DATASET + '/info_back')
-        sim_back = next(iter(load("TCFPACN"+ "/FBTP/params/" + DATASET + '/sim_back')))
-        abi_avg_back = modules.cal_ability_avg(p_abis_name_back)
-        # get the network of back
-        pg_back = greedy.players_graph_construction(sim_back, abi_avg_back, p_abis_name_back,
-                                                    abi_name_id, p_pos_back, p_r_back
-                                                    )
-
-        # 3: the Forward/Midfielder network
-        abi_name_id, p_attrs_forward, p_abis_name_forward, p_pos_forward, p_r_forward, p_no_id_forward = \
-        PESpre.read_info(FILE_PATH, FILE_FORWARD)  # read forward/midfielder information
-        sim_forward = modules.cal_similarity('Forward', p_attrs_forward)
-
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/info_forward', {'abi_name_id':abi_name_id, 'p_attrs_forward':p_attrs_forward,
-                                                                'p_abis_name_forward':p_abis_name_forward, 'p_pos_forward':p_pos_forward,
-                                                                'p_r_forward':p_r_forward, 'p_no_id_forward':p_no_id_forward
-                                                                }
-            )
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/sim_forward', {'sim_forward':sim_forward})
-        abi_name_id, p_attrs_forward, p_abis_name_forward, p_pos_forward, p_r_forward, p_no_id_forward = \
-            load("TCFPACN"+ "/FBTP/params/" + DATASET + '/info_forward')
-        sim_forward = next(iter(load("TCFPACN"+ "/FBTP/params/" + DATASET +  '/sim_forward')))
-        abi_avg_forward = modules.cal_ability_avg(p_abis_name_forward)
-        pg_forward = greedy.players_graph_construction(sim_forward, abi_avg_forward, p_abis_name_forward,
-                                                       abi_name_id, p_pos_forward, p_r_forward
-                                                       )
+
     elif DATASET == 'FIFA':
         FILE_GOALKEEPER = "Goalkeeper.csv"
         FILE_BACK = "Back.csv"
@@ -121,58 +90,38 @@ if __name__ == '__main__':
         BUDGET = 8
 
         FILE_PATH = 'TCFPACN' +'/Data/'+DATASET+'/'
-        cri_back = FIFApre.read_criteria(FILE_PATH, CRITERIA_BACK)  # read the backward criteria
-        cri_forward = FIFApre.read_criteria(FILE_PATH, CRITERIA_FORWARD)  # read the forward/midfielder criteria
-
-        # 1: the Goalkeepers
-        gks = FIFApre.get_goalkeepers(FILE_PATH, FILE_GOALKEEPER)
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/Goalkeepers', {'gks':gks})
-
-        # Carregamento de dados pré-processados (goleiros, informações de jogadores, similaridades)
-        gks = next(iter(load("TCFPACN"+ "/FBTP/params/" + DATASET + '/Goalkeepers'))) #Goleiros
-
-
-        abi_name_id, p_attrs_back, p_abis_name_back, p_pos_back, p_r_back, p_no_id_back = \
-        PESpre.read_info(FILE_PATH, FILE_BACK)  # read backwards information
-        sim_back = modules.cal_similarity('Back', p_attrs_back)  # calculate the similarity
-
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/info_back', {'abi_name_id':abi_name_id, 'p_attrs_back':p_attrs_back, 'p_abis_name_back':p_abis_name_back,'p_pos_back':p_pos_back, 'p_r_back':p_r_back, 'p_no_id_back':p_no_id_back}
-            )
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/sim_back', {'sim_back':sim_back})
-        abi_name_id, p_attrs_back, p_abis_name_back, p_pos_back, p_r_back, p_no_id_back = \
-            load("TCFPACN"+ "/FBTP/params/" + DATASET + '/info_back')
-        sim_back = next(iter(load("TCFPACN"+ "/FBTP/params/" + DATASET + '/sim_back')))
-        abi_avg_back = modules.cal_ability_avg(p_abis_name_back)
-        # get the network of back
-        pg_back = greedy.players_graph_construction(sim_back, abi_avg_back, p_abis_name_back,
-                                                    abi_name_id, p_pos_back, p_r_back
-                                                    )
-
-        # 3: the Forward/Midfielder network
-        abi_name_id, p_attrs_forward, p_abis_name_forward, p_pos_forward, p_r_forward, p_no_id_forward = \
-        PESpre.read_info(FILE_PATH, FILE_FORWARD)  # read forward/midfielder information
-        sim_forward = modules.cal_similarity('Forward', p_attrs_forward)
-
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/info_forward', {'abi_name_id':abi_name_id, 'p_attrs_forward':p_attrs_forward,
-                                                                'p_abis_name_forward':p_abis_name_forward, 'p_pos_forward':p_pos_forward,
-                                                                'p_r_forward':p_r_forward, 'p_no_id_forward':p_no_id_forward
-                                                                }
-            )
-        save("TCFPACN"+ "/FBTP/params/" + DATASET +'/sim_forward', {'sim_forward':sim_forward})
-        abi_name_id, p_attrs_forward, p_abis_name_forward, p_pos_forward, p_r_forward, p_no_id_forward = \
-            load("TCFPACN"+ "/FBTP/params/" + DATASET + '/info_forward')
-        sim_forward = next(iter(load("TCFPACN"+ "/FBTP/params/" + DATASET +  '/sim_forward')))
-        abi_avg_forward = modules.cal_ability_avg(p_abis_name_forward)
-        pg_forward = greedy.players_graph_construction(sim_forward, abi_avg_forward, p_abis_name_forward,
-                                                       abi_name_id, p_pos_forward, p_r_forward
-                                                       )
-
-
-    # Cálculo de médias de habilidades e construção dos grafos de jogadores (defesa e ataque/meio-campo)
-    abi_avg_back = modules.cal_ability_avg(p_abis_name_back)
-    pg_back = greedy.players_graph_construction(sim_back, abi_avg_back, p_abis_name_back, abi_name_id, p_pos_back, p_r_back)  # get the network of back
-
-    abi_avg_forward = modules.cal_ability_avg(p_abis_name_forward)
-    pg_forward = greedy.players_graph_construction(sim_forward, abi_avg_forward, p_abis_name_forward, abi_name_id, p_pos_forward, p_r_forward) # get the network of foward
+
+    # O leitor do conjunto de dados (PESpre ou FIFApre), atrás de uma mesma interface
+    adapter = dataset.DatasetAdapter(DATASET, FILE_PATH)
+    cri_back = adapter.criteria(CRITERIA_BACK)  # read the backward criteria
+    cri_forward = adapter.criteria(CRITERIA_FORWARD)  # read the forward/midfielder criteria
+
+    # Cada etapa do pré-processamento (leitura, similaridade, rede)
+    # é guardada sob o hash das suas entradas (conteúdo dos arquivos ou etapas anteriores),
+    # do seu código e dos seus parâmetros, e só é executada de novo quando algum deles muda.
+    cache = dataset.StageCache("TCFPACN" + "/FBTP/params/" + DATASET + '/cache')
+    FILES = {'Goalkeeper': FILE_GOALKEEPER, 'Back': FILE_BACK, 'Forward': FILE_FORWARD}
+
+    # read_info: os arquivos brutos são compilados em arrays (dataset) e mapeados em memória
+    info_key = cache.key('read_info', adapter.functions(),
+                         inputs=[cache.file_digest(FILE_PATH + FILES[name]) for name in sorted(FILES)],
+                         params=(DATASET, sorted(FILES.items())))
+    DATA_PATH = cache.path(info_key)
+    if not dataset.is_compiled(DATA_PATH):
+        adapter.compile(DATA_PATH, FILES)
+    data = dataset.load_dataset(DATA_PATH)
+
+    # 1: the Goalkeepers
+    gks = dataset.goalkeepers(data['Goalkeeper'])
+
+    # 2, 3: the Back and Forward/Midfielder players, as struct-of-arrays tables
+    table_back, table_forward = data['Back'], data['Forward']
+    abi_name_id = table_forward.ability_name_id
+    p_no_id_back = table_back.player_no_id()
+    p_no_id_forward = table_forward.player_no_id()
+
+    # Construção dos grafos de jogadores (defesa e ataque/meio-campo) direto das colunas
+    pg_back = network(cache, 'Back', info_key, COMPRESSED, table_back)  # get the network of back
+    pg_forward = network(cache, 'Forward', info_key, COMPRESSED, table_forward)  # get the network of foward
 
     fbtp.FBTP(gks, abi_name_id, p_no_id_back, pg_back, cri_back, p_no_id_forward, pg_forward, cri_forward, BUDGET, ALPHA, BETA, DATASET)
\ No newline at end of file
@@ -1,6 +1,10 @@
 # coding=utf-8
 
+from collections import OrderedDict
+import weakref
+
 import numpy as np
+import scipy.sparse as sp
 
 
 """
@@ -44,6 +48,113 @@ def cal_similarity(network_name, player_attributes):
 
     return similarity
 
+"""
+- Versão esparsa e vetorizada de <cal_similarity>.
+- Codifica os atributos (clube e nacionalidade) em uma matriz de incidência
+    esparsa jogador x atributo (one-hot), de modo que a interseção entre dois
+    jogadores é o produto escalar das suas linhas.
+- Calcula todas as similaridades Jaccard de uma vez com o produto esparso
+    incidence * incidence^T: |A ∩ B| vem do produto e |A ∪ B| = |A| + |B| - |A ∩ B|.
+- Retorna uma matriz scipy.sparse CSR (a diagonal sim(i, i) = 1 é mantida, como na
+    versão densa) e exibe o mesmo relatório de vértices, arestas e densidade.
+"""
+def cal_similarity_sparse(network_name, player_attributes):
+
+    no = len(player_attributes)
+    similarity = jaccard_sparse(attributes_incidence(player_attributes))
+
+    # the same report as cal_similarity: pairs (i <= j) with sim > 0, diagonal included
+    diag = np.count_nonzero(similarity.diagonal())
+    edge = (similarity.nnz - diag) // 2 + diag
+    density = (edge*2) / (no*no)  # the density of the players' adjacent matrix
+    edge = edge - no
+
+    print("The %s network includes %d vertex and %d edges, the density is %f"
+          % (network_name, no, edge, density)
+         )
+
+    return similarity
+
+
+"""
+- Versão comprimida da rede de similaridade.
+- A similaridade depende apenas do par [clube, nacionalidade], então jogadores com o
+    mesmo par formam uma classe de equivalência.
+- Retorna:
+--> class_sim: Matriz esparsa CSR (classe x classe) de similaridade Jaccard entre as classes;
+        com milhares de classes (FIFA), a maioria dos pares não tem atributo em comum.
+--> player_class: Vetor com a classe de cada jogador (índice do jogador -> classe).
+- Exibe o mesmo relatório de <cal_similarity> para a rede completa equivalente,
+    calculado a partir do tamanho das classes, sem materializar as arestas.
+"""
+def cal_class_similarity(network_name, player_attributes):
+
+    no = len(player_attributes)
+    class_id = {}  # (club, nationality) : class
+    class_attributes = {}
+    player_class = np.zeros(no, dtype=np.int64)
+    for i in range(no):
+        key = tuple(player_attributes[i])
+        if key not in class_id:
+            class_id[key] = len(class_id)
+            class_attributes[class_id[key]] = player_attributes[i]
+        player_class[i] = class_id[key]
+
+    class_sim = jaccard_sparse(attributes_incidence(class_attributes))
+
+    # pairs (i <= j) with sim > 0 in the full network, diagonal included
+    class_size = np.bincount(player_class, minlength=len(class_id)).astype(float)
+    rows = np.repeat(np.arange(len(class_id)), np.diff(class_sim.indptr))
+    linked = (class_size[rows] * class_size[class_sim.indices]).sum()
+    edge = int((linked + class_size @ (class_sim.diagonal() > 0)) // 2)
+    density = (edge*2) / (no*no)  # the density of the players' adjacent matrix
+    edge = edge - no
+
+    print("The %s network includes %d vertex (%d classes) and %d edges, the density is %f"
+          % (network_name, no, len(class_id), edge, density)
+         )
+
+    return class_sim, player_class
+
+
+"""
+- Similaridade Jaccard entre todas as linhas de uma matriz de incidência (<attributes_incidence>),
+    com o produto esparso incidence * incidence^T: |A ∩ B| vem do produto e
+    |A ∪ B| = |A| + |B| - |A ∩ B|. Só os pares com algum atributo em comum são guardados.
+- Retorna uma matriz scipy.sparse CSR com os índices de cada linha ordenados.
+"""
+def jaccard_sparse(incidence):
+
+    no = incidence.shape[0]
+    inter = (incidence @ incidence.T).tocsr()  # |A ∩ B| for every pair sharing an attribute
+    inter.sort_indices()
+    size = np.asarray(incidence.sum(axis=1)).ravel()  # |A|
+    rows = np.repeat(np.arange(no), np.diff(inter.indptr))
+    union = size[rows] + size[inter.indices] - inter.data
+    return sp.csr_matrix((inter.data / union, inter.indices, inter.indptr), shape=(no, no))
+
+
+"""
+- Função auxiliar que monta a matriz de incidência esparsa (CSR) jogador x atributo.
+- Cada valor distinto de atributo (clube ou nacionalidade) vira uma coluna.
+- Valores repetidos no mesmo jogador contam uma única vez, como no conjunto usado por <jaccard>.
+"""
+def attributes_incidence(player_attributes):
+
+    vocabulary = {}  # attribute value : column
+    rows = []
+    cols = []
+    for no in range(len(player_attributes)):
+        for value in set(player_attributes[no]):
+            rows.append(no)
+            cols.append(vocabulary.setdefault(value, len(vocabulary)))
+
+    incidence = sp.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                              shape=(len(player_attributes), len(vocabulary))
+                             )
+    return incidence
+
+
 """
 - Função auxiliar que calcula a similaridade Jaccard entre dois arrays de atributos.
 - Encontra a interseção e a união dos arrays.
@@ -77,4 +188,109 @@ def cal_ability_avg(player_abilities_name):
             c += 1
         ability_avg[ability] = total / c
 
-    return ability_avg
\ No newline at end of file
+    return ability_avg
+
+
+"""
+- Lê os critérios de avaliação (peso de cada habilidade) de um arquivo de texto,
+    uma linha <habilidade>:<peso> por critério, e normaliza seus valores.
+- Comum aos leitores PESpre e FIFApre.
+"""
+def read_criteria(path, criteria_file):
+    criteria = {}
+    with open(path + criteria_file, 'r') as cf:
+        while True:
+            line = cf.readline()
+            if not line:
+                break
+            name = line.split(":")[0]
+            value = line.split(":")[1][:-1]
+
+            criteria[name] = int(value)
+
+    criteria = normalize(criteria)
+
+    return criteria
+
+
+"""
+- Função auxiliar usada por read_criteria para normalizar os valores de um dicionário.
+- Divide cada valor pela soma total dos valores, garantindo que a soma dos valores normalizados seja 1.
+"""
+def normalize(dict_type):
+    total = sum(v for v in dict_type.values())
+    tmp = {}
+    for key, value in dict_type.items():
+        tmp[key] = value / total
+    return tmp
+
+
+class LRUCache:
+    """
+    Bounded memo of evaluations with least-recently-used eviction
+
+    Used to share team evaluations between greedy, PSO and pruning; keys are
+    canonicalised by the callers, e.g. (criteria, alpha, beta, sorted team ids), with one
+    cache per network (team_cache).
+    """
+
+    def __init__(self, maxsize=2**16):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        if key in self.data:
+            self.data.move_to_end(key)
+            self.hits += 1
+            return self.data[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)  # the least recently used
+
+    def lookup(self, key, compute):  # the cached value, computing (and storing) it on a miss
+        if key in self.data:
+            return self.get(key)
+        self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.data), 'maxsize': self.maxsize}
+
+
+_team_caches = weakref.WeakKeyDictionary()  # network : LRUCache
+
+
+"""
+- O cache de avaliações de times de uma rede, compartilhado por greedytoPSO e fbtp.
+- Há um cache por rede, guardado com uma referência fraca à rede: as chaves não
+    seguram a rede e o cache é descartado junto com ela.
+- network: A rede (players.Graph, ArrayGraph ou ClassGraph) ou o seu vertexList.
+"""
+def team_cache(network):
+    network = getattr(network, 'graph', network)  # accept a vertexList too
+    if network not in _team_caches:
+        _team_caches[network] = LRUCache()
+    return _team_caches[network]
+
+
+# Chave canônica de um time no cache de uma rede: (critérios, alpha, beta, IDs ordenados).
+def team_key(criteria, alpha, beta, team):
+    criteria = tuple(sorted(criteria.items())) if isinstance(criteria, dict) else criteria
+    return criteria, alpha, beta, tuple(sorted(int(p) for p in team))
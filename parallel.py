@@ -0,0 +1,239 @@
+# coding=utf-8
+
+"""
+Run the team search on several cores
+
+The arrays of the players' network are placed once in shared memory and every
+worker process maps them, so the network is not pickled again for each task.
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.getcwd()))
+sys.path.append(BASE_DIR)
+sys.path.append('TCFPACN')
+
+from FBTP import players, greedy, modules
+
+from multiprocessing import Pool, shared_memory
+import numpy as np
+
+
+"""
+- Copia os arrays da rede (players.ArrayGraph ou players.ClassGraph) para blocos de memória compartilhada.
+- Retorna:
+--> spec: Descrição picklable dos blocos (classe, nome/forma/tipo de cada array, nomes das posições),
+        usada por <attach_graph> nos processos filhos.
+--> blocks: Os blocos criados, que devem ser liberados com <release_graph>.
+"""
+def share_graph(pg):
+
+    graph = players.as_array_graph(pg)
+    layout = {}
+    blocks = []
+    for name, array in graph.arrays().items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        layout[name] = (block.name, array.shape, array.dtype.str)
+        blocks.append(block)
+
+    spec = (type(graph), layout, graph.position_names)
+    return spec, blocks
+
+
+# Reconstrói a rede a partir da memória compartilhada, sem copiar os arrays.
+def attach_graph(spec):
+    graph_class, layout, position_names = spec
+    arrays = {}
+    blocks = []
+    for name, (block_name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        blocks.append(block)
+
+    graph = graph_class.from_arrays(arrays, position_names)
+    graph._blocks = blocks  # keep the mappings alive as long as the graph
+    return graph
+
+
+# Libera os blocos de memória compartilhada criados por <share_graph>.
+def release_graph(blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+_worker = {}  # the state of a worker process: network, fitness, ...
+
+
+def _init_island(spec, criteria, abi_name_id, alpha, beta, network_name, num_particles, num_players, slots, cache):
+    graph = attach_graph(spec)
+    _worker['graph'] = graph
+    _worker['fitness'] = greedy.TeamFitness(graph, criteria, abi_name_id, alpha, beta, network_name,
+                                            cache=modules.team_cache(graph) if cache else None)
+    _worker['num_particles'] = num_particles
+    _worker['num_players'] = num_players
+    _worker['slots'] = slots  # (slot groups, slot pools) of the discrete swarm, or None
+
+
+# Executa algumas iterações de uma ilha (enxame) dentro de um processo filho.
+def _run_island(task):
+    swarm, iterations, migrant = task
+
+    if isinstance(swarm, np.random.SeedSequence):  # first epoch: create the swarm
+        if _worker['slots'] is not None:
+            swarm = greedy.SetSwarm(_worker['fitness'], _worker['num_particles'], *_worker['slots'],
+                                    np.random.default_rng(swarm))
+        else:
+            swarm = greedy.Swarm(_worker['fitness'], _worker['num_particles'], _worker['num_players'],
+                                 np.random.default_rng(swarm))
+    else:
+        swarm.fitness = _worker['fitness']
+        if _worker['slots'] is not None:
+            swarm.slot_pools = _worker['slots'][1]
+
+    if migrant is not None:
+        swarm.migrate(*migrant)
+
+    history = []
+    for _ in range(iterations):
+        swarm.step()
+        history.append(swarm.gbest_fitness)
+
+    return swarm, history
+
+
+def player_opt_subgraph_pso_islands(player_no_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource,
+                                    num_islands=4, num_particles=20, max_iterations=100, migration_interval=10,
+                                    seed=None, processes=None, discrete=False, cache=False):
+    """
+    Island-model PSO: the same search as greedy.player_opt_subgraph_pso, run by
+    num_islands independent swarms in a process pool.
+
+    - Cada ilha tem seu próprio fluxo de números aleatórios (SeedSequence(seed).spawn),
+        então o resultado é reproduzível para uma mesma semente.
+    - A cada migration_interval iterações as ilhas trocam seus melhores times em anel:
+        a ilha i recebe o gbest da ilha i-1 no lugar da sua pior partícula.
+    - A rede é compartilhada com os processos via memória compartilhada.
+    - Com discrete=True as ilhas são enxames discretos (greedy.SetSwarm).
+    - Com cache=True cada processo guarda os times já avaliados (modules.team_cache),
+        compartilhado pelas ilhas que ele executa.
+
+    Returns:
+        opt_players: IDs dos jogadores do melhor time encontrado.
+        stats: Uma lista (uma entrada por ilha) com o melhor fitness, o melhor time e
+            o histórico do gbest a cada iteração.
+    """
+
+    num_players = 4 if network_name == "Back" else 6  # Número de jogadores na equipe (sem goleiro)
+
+    slots = greedy.position_slots(pg, network_name, datasource) if discrete else None
+
+    spec, blocks = share_graph(pg)
+    swarms = np.random.SeedSequence(seed).spawn(num_islands)
+    histories = [[] for _ in range(num_islands)]
+    migrants = [None] * num_islands
+
+    try:
+        with Pool(processes, initializer=_init_island,
+                  initargs=(spec, criteria, abi_name_id, alpha, beta, network_name, num_particles, num_players, slots,
+                            cache)
+                 ) as pool:
+            done = 0
+            while done < max_iterations:
+                iterations = min(migration_interval, max_iterations - done)
+                tasks = [(swarms[i], iterations, migrants[i]) for i in range(num_islands)]
+                results = pool.map(_run_island, tasks)
+                done += iterations
+
+                swarms = [swarm for swarm, _ in results]
+                for i, (_, history) in enumerate(results):
+                    histories[i].extend(history)
+
+                # ring migration of the global bests
+                migrants = [(swarms[i-1].gbest, swarms[i-1].gbest_fitness) for i in range(num_islands)]
+    finally:
+        release_graph(blocks)
+
+    stats = []
+    for i, swarm in enumerate(swarms):
+        stats.append({'island': i,
+                      'gbest_fitness': swarm.gbest_fitness,
+                      'gbest': [player_no_id[p] for p in swarm.gbest.tolist()],
+                      'history': histories[i]})
+
+    best = max(range(num_islands), key=lambda i: swarms[i].gbest_fitness)
+    opt_players = stats[best]['gbest']
+
+    return opt_players, stats
+
+
+def _init_multistart(spec, player_num_id, criteria, abi_name_id, alpha, beta, network_name, datasource, beam_width):
+    graph = attach_graph(spec)
+    _worker['graph'] = graph
+    _worker['fitness'] = greedy.TeamFitness(graph, criteria, abi_name_id, alpha, beta, network_name)
+    _worker['args'] = (player_num_id, graph.vertexList, criteria, abi_name_id, alpha, beta)
+    _worker['setting'] = (network_name, datasource)
+    _worker['beam_width'] = beam_width
+
+
+# Executa o guloso (ou o beam search) a partir de um jogador central dentro de um processo filho.
+def _run_star(star):
+    network_name, datasource = _worker['setting']
+    if _worker['beam_width'] is None:
+        team = greedy.select_opt_players(*_worker['args'], star, network_name, datasource, verbose=False)
+    else:
+        team = greedy.select_opt_players_beam(*_worker['args'], star, network_name, datasource,
+                                              beam_width=_worker['beam_width'], verbose=False)
+
+    threshold = 4 if network_name == "Back" else 6
+    if team is None or len(team) < threshold:  # incomplete team
+        return star, team, -np.inf
+    fitness = _worker['fitness']([team])[0]
+
+    return star, team, fitness
+
+
+def select_opt_players_multistart(player_num_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource,
+                                  top_k=None, beam_width=None, processes=None, chunksize=16):
+    """
+    Multi-start greedy: runs greedy.select_opt_players (or select_opt_players_beam when
+    beam_width is given) from every player as the star, or from the top_k players by
+    personal ability, in a process pool sharing the network arrays.
+
+    - Todos os times são comparados com o mesmo greedy.TeamFitness; times que não puderam
+        ser completados (estrela sem vizinhos suficientes) recebem -inf.
+    - Jogadores cuja posição não tem cota (<greedy.position_groups>) não são usados como estrela.
+
+    Returns:
+        opt_players: IDs dos jogadores do melhor time (None se nenhum time foi completado).
+        scores: Dicionário {ID do jogador central: fitness do time construído a partir dele}.
+    """
+
+    graph = greedy.position_groups(pg, datasource)
+    if top_k is None:
+        stars = list(range(graph.numVertices))
+    else:
+        abilities = greedy.cal_players_ability(graph, criteria, abi_name_id)
+        stars = np.argsort(-abilities, kind='stable')[:top_k].tolist()
+    stars = [star for star in stars if graph.group_code[star] >= 0]
+
+    spec, blocks = share_graph(graph)
+    try:
+        with Pool(processes, initializer=_init_multistart,
+                  initargs=(spec, player_num_id, criteria, abi_name_id, alpha, beta, network_name, datasource, beam_width)
+                 ) as pool:
+            results = pool.map(_run_star, stars, chunksize=chunksize)
+    finally:
+        release_graph(blocks)
+
+    scores = {player_num_id[star]: fitness for star, _, fitness in results}
+    _, team, fitness = max(results, key=lambda result: result[2], default=(None, None, -np.inf))
+    if fitness == -np.inf:
+        print("No star could complete a team")
+        return None, scores
+    opt_players = [player_num_id[player_id] for player_id in team]
+
+    print("The best players are:", opt_players, "with fitness %.4f" % fitness)
+
+    return opt_players, scores
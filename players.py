@@ -1,5 +1,11 @@
 # coding=utf-8
 
+from collections.abc import Mapping
+import weakref
+
+import numpy as np
+import scipy.sparse as sp
+
 
 class Player: # Representa um jogador de futebol.
 
@@ -85,13 +91,29 @@ class CutPlayer:
         return self.cut_salary
 
 
+class VertexList(dict):
+    """
+    The vertices of a graph {key: Player}, keeping a reference to the graph
+    so that neighbor queries can be delegated to it
+    """
+
+    def __init__(self, graph):
+        super().__init__()
+        self.graph = graph
+
+
 class Graph:
 
     def __init__(self):
-        self.vertexList = {} # Dicionário que armazena os jogadores (vértices do grafo) e suas conexões.
+        self.vertexList = VertexList(self) # Dicionário que armazena os jogadores (vértices do grafo) e suas conexões.
         self.numVertices = 0 # Número total de vértices no grafo.
+        self.version = 0 # Incrementado a cada alteração; invalida a conversão de <as_array_graph>.
+
+    def changed(self): # Marca o grafo como alterado, após editar os jogadores (Player) diretamente.
+        self.version += 1
 
     def add_vertex(self, key): # Adiciona um jogador (vértice) ao grafo.
+        self.version += 1
         self.numVertices = self.numVertices + 1
         newVertex = Player(key)
         self.vertexList[key] = newVertex
@@ -115,10 +137,510 @@ class Graph:
             nv = self.add_vertex(t)
 
         self.vertexList[f].add_neighbor(self.vertexList[t], cost)
+        self.version += 1
 
     def get_vertices(self):  # Retorna uma lista com todos os jogadores (vértices) do grafo.
         return self.vertexList.keys()
 
+    def neighbors(self, key): # Retorna os IDs dos vizinhos de um jogador.
+        return np.array([nbr.id for nbr in self.vertexList[key].connectedTo], dtype=np.int64)
+
+    def team_neighbors(self, team): # Retorna os IDs (ordenados) dos vizinhos de um time, exceto o próprio time.
+        neighbor = set()
+        for player in team:
+            neighbor.update(nbr.id for nbr in self.vertexList[player].connectedTo)
+        neighbor.difference_update(team)
+        return np.array(sorted(neighbor), dtype=np.int64)
+
+    def weight(self, f, t): # Retorna o peso da aresta (f, t), ou 0 se não houver conexão.
+        return self.vertexList[f].connectedTo.get(self.vertexList[t], 0)
+
+    def __iter__(self):
+        return iter(self.vertexList.values())
+
+
+class ArrayPlayer:
+    """
+    A view of one vertex of an ArrayGraph with the same interface as Player
+    """
+
+    def __init__(self, graph, key):
+        self.graph = graph
+        self.id = key
+
+    @property
+    def connectedTo(self):
+        return Adjacency(self.graph, self.id)
+
+    @property
+    def abilities(self):
+        return dict(zip(self.graph.ability_ids.tolist(), self.graph.abilities[self.id].tolist()))
+
+    @property
+    def position(self):
+        return str(self.graph.position_names[self.graph.position_code[self.id]])
+
+    @property
+    def salary(self):
+        return float(self.graph.salary[self.id])
+
+    def __eq__(self, other):
+        return isinstance(other, ArrayPlayer) and other.graph is self.graph and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return str(self.id) + ' connectedTo : ' + str(self.graph.neighbors(self.id).tolist())
+
+    def get_connection(self):  # get the neighbors
+        return self.connectedTo.keys()
+
+    def get_id(self):
+        return self.id
+
+    def get_abilities(self):
+        return self.abilities
+
+    def get_position(self):
+        return self.position
+
+    def get_salary(self):
+        return self.salary
+
+    def get_weight(self, nbr):  # get the weight of a neighbor
+        return self.connectedTo[nbr]
+
+
+class Adjacency(Mapping):
+    """
+    The neighbors of one vertex of an ArrayGraph {ArrayPlayer: weight}, read from the arrays
+    """
+
+    def __init__(self, graph, key):
+        self.graph = graph
+        self.id = key
+
+    def __getitem__(self, nbr):
+        w = self.graph.weight(self.id, nbr.id)
+        if w == 0:
+            raise KeyError(nbr.id)
+        return w
+
+    def __contains__(self, nbr):
+        return self.graph.weight(self.id, nbr.id) != 0
+
+    def __iter__(self):
+        return (ArrayPlayer(self.graph, ne) for ne in self.graph.neighbors(self.id).tolist())
+
+    def __len__(self):
+        return len(self.graph.neighbors(self.id))
+
+
+class ArrayVertexList(Mapping):
+    """
+    The vertices of an ArrayGraph {key: ArrayPlayer}, so that code written for
+    Graph.vertexList keeps working
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, key):
+        if not 0 <= key < self.graph.numVertices:
+            raise KeyError(key)
+        return ArrayPlayer(self.graph, int(key))
+
+    def __iter__(self):
+        return iter(range(self.graph.numVertices))
+
+    def __len__(self):
+        return self.graph.numVertices
+
+
+class PlayerArrays:
+    """
+    The players of an array-backed network, shared by ArrayGraph and ClassGraph
+
+    The players are kept in parallel NumPy arrays: position code, salary and
+    the ability matrix (one column per ability id), plus the optional position
+    groups. vertexList/get_vertex expose the same API as Graph; the subclasses
+    store the edges and answer the neighbor and weight queries.
+    """
+
+    def set_players(self, position, salary, abilities, ability_ids):
+        self.position_names, position_code = np.unique(np.asarray(position, dtype=str), return_inverse=True)
+        self.position_code = position_code.astype(np.int64)  # position_names[position_code[i]] is the position of i
+        self.salary = np.asarray(salary, dtype=float)
+        abilities = np.asarray(abilities, dtype=float)
+        self.abilities = abilities if abilities.ndim == 2 else abilities.reshape(len(self.salary), -1)
+        self.ability_ids = np.asarray(ability_ids, dtype=np.int64)
+        self.numVertices = len(self.salary)
+        self.vertexList = ArrayVertexList(self)
+
+    @classmethod
+    def from_arrays(cls, arrays, position_names):
+        """
+        Rebuild a graph around the arrays returned by arrays() (e.g. in shared memory), without copying them
+        """
+        graph = cls.__new__(cls)
+        graph.__dict__.update(arrays)
+        graph.position_names = position_names
+        graph.numVertices = len(graph.salary)
+        graph.vertexList = ArrayVertexList(graph)
+        return graph
+
+    def set_groups(self, group_names, position_group, datasource):
+        """
+        Set the position groups of the players
+
+        position_group maps each position code to the index of its group in
+        group_names (-1 if none). The players get the integer array group_code
+        and group_members[g] lists the ids of group g.
+        """
+        self.group_names = list(group_names)
+        self.group_datasource = datasource
+        self.group_code = np.asarray(position_group, dtype=np.int64)[self.position_code]
+        order = np.argsort(self.group_code, kind='stable')
+        bounds = np.searchsorted(self.group_code[order], np.arange(len(self.group_names) + 1))
+        self.group_members = [order[bounds[g]:bounds[g+1]] for g in range(len(self.group_names))]
+
+    def group_neighbors(self, key, group): # Retorna os vizinhos de um jogador que pertencem a um grupo de posição.
+        neighbor = self.neighbors(key)
+        return neighbor[self.group_code[neighbor] == group]
+
+    def get_vertex(self, key): # Retorna um jogador (vértice) do grafo, se existir.
+        return self.vertexList.get(key)
+
+    def __contains__(self, key):
+        return key in self.vertexList
+
+    def get_vertices(self):
+        return self.vertexList.keys()
+
     def __iter__(self):
         return iter(self.vertexList.values())
-	
+
+
+class ArrayGraph(PlayerArrays):
+    """
+    Array-backed players' network
+
+    The adjacency is stored in CSR form (indptr/indices/weights, neighbors of
+    each player sorted by id, which weight and pair_weights rely on) and the
+    players in the arrays of PlayerArrays.
+    """
+
+    def __init__(self, indptr, indices, weights, position, salary, abilities, ability_ids):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=float)
+        self.set_players(position, salary, abilities, ability_ids)
+        self._edge_keys = None
+        self.sort_indices()
+
+    def sort_indices(self): # Ordena os vizinhos de cada jogador pelo ID (com os pesos) e rejeita arestas repetidas.
+        keys = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr)) \
+               * self.numVertices + self.indices
+        if (np.diff(keys) <= 0).any():
+            order = np.argsort(keys, kind='stable')
+            keys, self.indices, self.weights = keys[order], self.indices[order], self.weights[order]
+            if (np.diff(keys) == 0).any():
+                raise ValueError("the network has repeated edges")
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Convert a Graph (dict of Player objects) to an ArrayGraph
+        """
+        vertices = list(graph.get_vertices())
+        if not vertices:  # an empty network
+            return cls(np.zeros(1, dtype=np.int64), [], [], [], [], np.zeros((0, 0)), [])
+        n = max(vertices) + 1
+        ability_ids = sorted(max((v.abilities for v in graph), key=len))
+        position = [''] * n
+        salary = np.zeros(n)
+        abilities = np.zeros((n, len(ability_ids)))
+        rows, cols, weights = [], [], []
+        for v in graph:
+            position[v.id] = v.position if v.position is not None else ''
+            salary[v.id] = v.salary
+            abilities[v.id] = [v.abilities.get(a, 0) for a in ability_ids]
+            for nbr, w in v.connectedTo.items():
+                rows.append(v.id)
+                cols.append(nbr.id)
+                weights.append(w)
+
+        order = np.lexsort((cols, rows))
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(np.asarray(rows, dtype=np.int64), minlength=n))))
+        return cls(indptr, np.asarray(cols, dtype=np.int64)[order], np.asarray(weights, dtype=float)[order],
+                   position, salary, abilities, ability_ids)
+
+    def arrays(self):
+        """
+        The numeric arrays that define the graph {name: array}, see from_arrays
+        """
+        return {'indptr': self.indptr, 'indices': self.indices, 'weights': self.weights,
+                'position_code': self.position_code, 'salary': self.salary,
+                'abilities': self.abilities, 'ability_ids': self.ability_ids}
+
+    @classmethod
+    def from_arrays(cls, arrays, position_names):
+        graph = super().from_arrays(arrays, position_names)
+        graph._edge_keys = None
+        return graph
+
+    def degree(self): # Retorna o grau de todos os jogadores.
+        return np.diff(self.indptr)
+
+    def max_weights(self): # Retorna o maior peso de aresta de cada jogador (0 sem vizinhos).
+        result = np.zeros(self.numVertices)
+        linked = self.degree() > 0
+        if linked.any():
+            result[linked] = np.maximum.reduceat(self.weights, self.indptr[:-1][linked])
+        return result
+
+    def neighbors(self, key): # Retorna os IDs dos vizinhos de um jogador.
+        return self.indices[self.indptr[key]:self.indptr[key+1]]
+
+    def team_neighbors(self, team): # Retorna os IDs (ordenados) dos vizinhos de um time, exceto o próprio time.
+        team = np.asarray(team, dtype=np.int64)
+        neighbor = np.unique(np.concatenate([self.neighbors(p) for p in team.tolist()] + [np.zeros(0, dtype=np.int64)]))
+        return neighbor[~np.isin(neighbor, team)]
+
+    def weight(self, f, t): # Retorna o peso da aresta (f, t), ou 0 se não houver conexão.
+        start, end = self.indptr[f], self.indptr[f+1]
+        k = start + np.searchsorted(self.indices[start:end], t)
+        if k < end and self.indices[k] == t:
+            return self.weights[k]
+        return 0
+
+    def pair_weights(self, f, t):
+        """
+        Vectorized weight lookup: the weights of the edges (f[i], t[i]), 0 where there is no edge
+        """
+        if self._edge_keys is None:
+            self._edge_keys = np.repeat(np.arange(self.numVertices, dtype=np.int64), self.degree()) \
+                              * self.numVertices + self.indices
+        f = np.asarray(f, dtype=np.int64)
+        t = np.asarray(t, dtype=np.int64)
+        keys = f * self.numVertices + t
+        if len(self._edge_keys) == 0:
+            return np.zeros(keys.shape)
+        k = np.minimum(np.searchsorted(self._edge_keys, keys), len(self._edge_keys) - 1)
+        return np.where(self._edge_keys[k] == keys, self.weights[k], 0.0)
+
+
+class ClassGraph(PlayerArrays):
+    """
+    The compressed players' network
+
+    Players with the same [club, nationality] pair have the same similarity to
+    everybody else, so they are grouped in equivalence classes. Only the
+    class-to-class similarity table (sparse, CSR arrays) and the player-to-class
+    index are stored, and neighbors are queried per class instead of per explicit edge.
+    """
+
+    def __init__(self, class_sim, player_class, position, salary, abilities, ability_ids):
+        class_sim = sp.csr_matrix(class_sim) # Similaridade classe x classe.
+        class_sim.eliminate_zeros()
+        class_sim.sort_indices()
+        self.class_indptr = class_sim.indptr.astype(np.int64)
+        self.class_indices = class_sim.indices.astype(np.int64)
+        self.class_weights = class_sim.data.astype(float)
+        self.player_class = np.asarray(player_class, dtype=np.int64) # Classe de cada jogador.
+        self.set_players(position, salary, abilities, ability_ids)
+        self.set_classes()
+
+    def set_classes(self):
+        # the members of each class and the classes linked to each class
+        self.num_classes = len(self.class_indptr) - 1
+        order = np.argsort(self.player_class, kind='stable')
+        bounds = np.searchsorted(self.player_class[order], np.arange(self.num_classes + 1))
+        self.class_members = [order[bounds[c]:bounds[c+1]] for c in range(self.num_classes)]
+        self.class_neighbors = [self.class_indices[self.class_indptr[c]:self.class_indptr[c+1]]
+                                for c in range(self.num_classes)]
+        rows = np.repeat(np.arange(self.num_classes, dtype=np.int64), np.diff(self.class_indptr))
+        self._class_keys = rows * self.num_classes + self.class_indices  # sorted, as the CSR rows
+
+    @property
+    def class_sim(self): # A tabela de similaridade classe x classe (scipy.sparse CSR).
+        return sp.csr_matrix((self.class_weights, self.class_indices, self.class_indptr),
+                             shape=(self.num_classes, self.num_classes))
+
+    def arrays(self):
+        """
+        The numeric arrays that define the graph {name: array}, see from_arrays
+        """
+        return {'class_indptr': self.class_indptr, 'class_indices': self.class_indices,
+                'class_weights': self.class_weights, 'player_class': self.player_class,
+                'position_code': self.position_code, 'salary': self.salary,
+                'abilities': self.abilities, 'ability_ids': self.ability_ids}
+
+    @classmethod
+    def from_arrays(cls, arrays, position_names):
+        graph = super().from_arrays(arrays, position_names)
+        graph.set_classes()
+        return graph
+
+    def members(self, classes): # Retorna os jogadores (ordenados) de um conjunto de classes.
+        if len(classes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate([self.class_members[c] for c in classes]))
+
+    def class_pair_weights(self, f, t): # Similaridade entre as classes f[i] e t[i], 0 se não houver ligação.
+        keys = np.asarray(f, dtype=np.int64) * self.num_classes + np.asarray(t, dtype=np.int64)
+        if len(self._class_keys) == 0:
+            return np.zeros(keys.shape)
+        k = np.minimum(np.searchsorted(self._class_keys, keys), len(self._class_keys) - 1)
+        return np.where(self._class_keys[k] == keys, self.class_weights[k], 0.0)
+
+    def degree(self): # Retorna o grau de todos os jogadores.
+        class_size = np.bincount(self.player_class, minlength=self.num_classes)
+        rows = np.repeat(np.arange(self.num_classes), np.diff(self.class_indptr))
+        linked = np.bincount(rows, weights=class_size[self.class_indices], minlength=self.num_classes)
+        classes = np.arange(self.num_classes)
+        self_linked = self.class_pair_weights(classes, classes) > 0
+        return (linked - self_linked)[self.player_class].astype(np.int64)
+
+    def max_weights(self): # Retorna um limite superior do maior peso de aresta de cada jogador.
+        result = np.zeros(self.num_classes)
+        linked = np.diff(self.class_indptr) > 0
+        if linked.any():
+            result[linked] = np.maximum.reduceat(self.class_weights, self.class_indptr[:-1][linked])
+        return result[self.player_class]
+
+    def neighbors(self, key): # Retorna os IDs dos vizinhos de um jogador.
+        neighbor = self.members(self.class_neighbors[self.player_class[key]])
+        return neighbor[neighbor != key]
+
+    def team_neighbors(self, team): # Retorna os IDs (ordenados) dos vizinhos de um time, exceto o próprio time.
+        classes = np.unique(self.player_class[list(team)])
+        linked = np.unique(np.concatenate([self.class_neighbors[c] for c in classes.tolist()]
+                                          + [np.zeros(0, dtype=np.int64)]))
+        neighbor = self.members(linked)
+        return neighbor[~np.isin(neighbor, list(team))]
+
+    def weight(self, f, t): # Retorna o peso da aresta (f, t), ou 0 se não houver conexão.
+        if f == t:
+            return 0
+        return self.class_pair_weights(self.player_class[f], self.player_class[t])[()]
+
+    def pair_weights(self, f, t):
+        """
+        Vectorized weight lookup: the weights of the edges (f[i], t[i]), 0 where there is no edge
+        """
+        f = np.asarray(f, dtype=np.int64)
+        t = np.asarray(t, dtype=np.int64)
+        return np.where(f != t, self.class_pair_weights(self.player_class[f], self.player_class[t]), 0.0)
+
+
+class TeamStats:
+    """
+    Ability statistics of a team, kept up to date while the team changes
+
+    For each ability it keeps the sum of the absolute differences over all
+    (ordered) pairs of players and the sum of the values, which is all the Gini
+    coefficient needs. Adding, removing or swapping one player costs
+    O(team x abilities), and so does evaluating a candidate move.
+    """
+
+    def __init__(self, graph, team=()):
+        self.graph = as_array_graph(graph)
+        k = self.graph.abilities.shape[1]
+        self.team = []  # player ids
+        self.rows = np.zeros((0, k))  # abilities of the team, one row per player
+        self.diff = np.zeros(k)  # sum of |x_i - x_j| over ordered pairs
+        self.total = np.zeros(k)  # sum of x_i
+        for player in team:
+            self.add(player)
+
+    def copy(self):
+        stats = TeamStats.__new__(TeamStats)
+        stats.graph = self.graph
+        stats.team = list(self.team)
+        stats.rows = self.rows.copy()
+        stats.diff = self.diff.copy()
+        stats.total = self.total.copy()
+        return stats
+
+    def __len__(self):
+        return len(self.team)
+
+    def add(self, player):
+        row = self.graph.abilities[player]
+        self.diff += 2 * np.abs(self.rows - row).sum(axis=0)
+        self.total += row
+        self.rows = np.vstack((self.rows, row))
+        self.team.append(player)
+
+    def remove(self, player):
+        idx = self.team.index(player)
+        row = self.rows[idx]
+        self.rows = np.delete(self.rows, idx, axis=0)
+        self.team.pop(idx)
+        self.diff -= 2 * np.abs(self.rows - row).sum(axis=0)
+        self.total -= row
+
+    def swap(self, out, player):
+        self.remove(out)
+        self.add(player)
+
+    def gini(self):
+        """
+        The Gini coefficient of the team, averaged over the abilities
+        """
+        return gini_mean(self.diff, 2 * len(self.team) * self.total)
+
+    def gini_add(self, candidates):
+        """
+        The Gini coefficient of team + candidate for every candidate (array of ids)
+        """
+        cand = self.graph.abilities[np.asarray(candidates, dtype=np.int64)]
+        m = len(self.team) + 1
+        diff = self.diff + 2 * np.abs(cand[:, None, :] - self.rows[None, :, :]).sum(axis=1)
+        return gini_mean(diff, 2 * m * (self.total + cand))
+
+    def gini_swap(self, out, candidates):
+        """
+        The Gini coefficient of the team with <out> replaced by each candidate (array of ids)
+        """
+        idx = self.team.index(out)
+        row = self.rows[idx]
+        rows = np.delete(self.rows, idx, axis=0)
+        cand = self.graph.abilities[np.asarray(candidates, dtype=np.int64)]
+        m = len(self.team)
+        diff = self.diff - 2 * np.abs(rows - row).sum(axis=0) \
+               + 2 * np.abs(cand[:, None, :] - rows[None, :, :]).sum(axis=1)
+        return gini_mean(diff, 2 * m * (self.total - row + cand))
+
+
+# A média, sobre as habilidades (último eixo), do Gini diff / scale; 0 onde scale é 0 (time vazio ou só zeros).
+def gini_mean(diff, scale):
+    diff, scale = np.broadcast_arrays(diff, scale)
+    if diff.shape[-1] == 0:  # no abilities
+        return np.zeros(diff.shape[:-1]) if diff.ndim > 1 else 0.0
+    gini = np.divide(diff, scale, out=np.zeros(diff.shape), where=scale != 0)
+    return gini.mean(axis=-1)
+
+
+_array_graphs = weakref.WeakKeyDictionary()
+
+
+def as_array_graph(graph):
+    """
+    The array form of a graph: the graph itself if it is already array-backed
+    (ArrayGraph or ClassGraph), otherwise its ArrayGraph conversion
+
+    The conversion is computed once per graph version: add_vertex and add_edge
+    invalidate it, and so must Graph.changed() after editing a Player directly.
+    """
+    if isinstance(graph, PlayerArrays):
+        return graph
+    graph = getattr(graph, 'graph', graph)  # accept a vertexList too
+    if isinstance(graph, PlayerArrays):
+        return graph
+    version = getattr(graph, 'version', 0)
+    if graph not in _array_graphs or _array_graphs[graph][0] != version:
+        _array_graphs[graph] = (version, ArrayGraph.from_graph(graph))
+    return _array_graphs[graph][1]
@@ -0,0 +1,58 @@
+# coding=utf-8
+
+"""
+Test setup: the modules import each other as the FBTP package (from FBTP import ...),
+with greedytoPSO imported as FBTP.greedy, so the repository is registered under that name.
+"""
+
+import importlib
+import os, sys
+import types
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if 'FBTP' not in sys.modules:
+    package = types.ModuleType('FBTP')
+    package.__path__ = [ROOT]
+    sys.modules['FBTP'] = package
+    package.greedy = sys.modules['FBTP.greedy'] = importlib.import_module('FBTP.greedytoPSO')
+
+from FBTP import players
+
+
+ABI_NAME_ID = {'speed': 0, 'pass': 1, 'shot': 2, 'defence': 3}
+CRITERIA = {'speed': 0.4, 'pass': 0.3, 'shot': 0.2, 'defence': 0.1}
+
+
+# Uma rede aleatória (players.ArrayGraph) com pesos, salários e habilidades contínuos, sem empates.
+def random_network(n, positions, density=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    adjacency = sp.random(n, n, density=density, random_state=seed, format='csr')
+    adjacency = sp.triu(adjacency, 1)
+    adjacency = (adjacency + adjacency.T).tocsr()
+    adjacency.sort_indices()
+    return players.ArrayGraph(adjacency.indptr, adjacency.indices, adjacency.data,
+                              rng.choice(positions, n), rng.random(n) * 10,
+                              rng.random((n, len(ABI_NAME_ID))) * 90 + 10, list(ABI_NAME_ID.values()))
+
+
+# Goleiros (players.Goalkeeper) com habilidades e salários aleatórios.
+def random_goalkeepers(n, seed=0):
+    rng = np.random.default_rng(seed)
+    gks = []
+    for g_id in range(n):
+        gk = players.Goalkeeper(10000 + g_id)
+        gk.ability = (rng.random(5) * 90 + 10).tolist()
+        gk.rating = int(np.mean(gk.ability))
+        gk.salary = float(rng.random() * 10)
+        gks.append(gk)
+    return gks
+
+
+@pytest.fixture
+def network():
+    return random_network
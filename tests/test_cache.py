@@ -0,0 +1,46 @@
+# coding=utf-8
+
+import numpy as np
+import pytest
+
+from FBTP import greedy, modules
+
+from conftest import ABI_NAME_ID, CRITERIA
+
+
+def test_pso_cache_hits_on_repeated_particles(network):
+    graph = network(30, ['CB', 'LB', 'RB'], seed=1)
+    player_no_id = {i: i for i in range(graph.numVertices)}
+    cache = modules.team_cache(graph)
+    cache.clear()
+
+    opt_players = greedy.player_opt_subgraph_pso(player_no_id, graph, CRITERIA, ABI_NAME_ID, 0.6, 0.2, 'Back', 'PES',
+                                                 max_iterations=30, seed=0, discrete=True, cache=cache)
+    hits = cache.hits
+    assert hits > 0 and len(cache) > 0
+    assert opt_players == greedy.player_opt_subgraph_pso(player_no_id, graph, CRITERIA, ABI_NAME_ID, 0.6, 0.2,
+                                                         'Back', 'PES', max_iterations=30, seed=0, discrete=True)
+
+    greedy.player_opt_subgraph_pso(player_no_id, graph, CRITERIA, ABI_NAME_ID, 0.6, 0.2, 'Back', 'PES',
+                                   max_iterations=30, seed=0, discrete=True, cache=cache)
+    assert cache.hits > hits
+
+
+def test_cached_gini_matches_uncached(network):
+    graph = network(30, ['CB', 'LB', 'RB'], seed=2)
+    cache = modules.team_cache(graph)
+    cache.clear()
+    team, candidates = [0, 1, 2], np.arange(3, 30)
+
+    expected = greedy.cal_homogeneity_batch(graph, team, candidates)
+    assert greedy.cal_homogeneity_batch(graph, team, candidates, cache) == pytest.approx(expected)
+    assert cache.hits == 0
+    assert greedy.cal_homogeneity_batch(graph, team, candidates, cache) == pytest.approx(expected)
+    assert cache.hits == len(candidates)
+
+
+def test_team_cache_is_per_network_and_opt_in(network):
+    first, second = network(10, ['CB'], seed=0), network(10, ['CB'], seed=1)
+    assert modules.team_cache(first) is modules.team_cache(first.vertexList)
+    assert modules.team_cache(first) is not modules.team_cache(second)
+    assert greedy.TeamFitness(first, CRITERIA, ABI_NAME_ID, 0.6, 0.2, 'Back').cache is None
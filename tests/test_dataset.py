@@ -0,0 +1,80 @@
+# coding=utf-8
+
+import types
+
+import numpy as np
+import pytest
+
+from FBTP import dataset
+
+from conftest import random_goalkeepers
+
+
+# Um leitor (como PESpre/FIFApre) que devolve colunas aleatórias, com um clube em branco.
+def random_reader(n=20, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def read_columns(file_name):
+        return {'id': np.arange(n, dtype=np.int64) + 500,
+                'rating': rng.integers(60, 90, n),
+                'position': rng.integers(0, 3, n),
+                'club': rng.integers(0, 3, n),
+                'nationality': rng.integers(0, 2, n),
+                'abilities': rng.integers(40, 99, (n, 5)),
+                'ability_names': ['a%d' % k for k in range(5)],
+                'position_names': ['CB', 'LB', 'RB'],
+                'club_names': ['Club A', float('nan'), 'Club C'],
+                'nationality_names': ['X', 'Y']}
+
+    return types.SimpleNamespace(read_columns=read_columns, get_goalkeepers=lambda file_name: random_goalkeepers(4),
+                                 read_criteria=lambda path, file_name: {})
+
+
+def test_compiled_dataset_round_trips(tmp_path):
+    adapter = dataset.DatasetAdapter('PES', str(tmp_path) + '/', reader=random_reader())
+    files = {'Goalkeeper': 'gk', 'Back': 'back', 'Forward': 'forward'}
+    directory = str(tmp_path / 'compiled')
+    assert not dataset.is_compiled(directory)
+    adapter.compile(directory, files)
+    assert dataset.is_compiled(directory)
+
+    data = dataset.load_dataset(directory)
+    gks = random_goalkeepers(4)
+    loaded = dataset.goalkeepers(data['Goalkeeper'])
+    assert [(gk.id, gk.rating, gk.salary) for gk in loaded] == [(gk.id, gk.rating, gk.salary) for gk in gks]
+    np.testing.assert_allclose([gk.ability for gk in loaded], np.array([gk.ability for gk in gks], dtype=np.int64))
+
+    # the same reader again reads the same columns, file after file
+    adapter = dataset.DatasetAdapter('PES', str(tmp_path) + '/', reader=random_reader())
+    for network_name in dataset.NETWORKS:
+        table = data[network_name]
+        expected = adapter.players(files[network_name])
+        assert isinstance(table.abilities, np.memmap)
+        for name in ('id', 'rating', 'salary', 'position', 'club', 'nationality', 'abilities'):
+            np.testing.assert_array_equal(getattr(table, name), getattr(expected, name))
+        assert str(table.attributes()) == str(expected.attributes())  # the blank club is NaN, and NaN != NaN
+        info, expected_info = dataset.read_info(table), expected.info()
+        for i in (0, 2, 3, 4, 5):
+            assert info[i] == expected_info[i]
+
+
+def test_stage_cache_hits_misses_and_keys(tmp_path, network):
+    cache = dataset.StageCache(str(tmp_path / 'stages'))
+    calls = []
+
+    def stage(n, seed):
+        calls.append((n, seed))
+        return network(n, ['CB', 'LB', 'RB'], seed=seed)
+
+    graph, key = cache.run('network', stage, (12, 0), inputs=['digest'], params=(12, 0))
+    cached, cached_key = cache.run('network', stage, (12, 0), inputs=['digest'], params=(12, 0))
+    assert calls == [(12, 0)] and cached_key == key
+    for name, array in graph.arrays().items():
+        np.testing.assert_array_equal(cached.arrays()[name], array)
+
+    _, other = cache.run('network', stage, (12, 1), inputs=['digest'], params=(12, 1))
+    _, changed = cache.run('network', stage, (12, 0), inputs=['other digest'], params=(12, 0))
+    assert len({key, other, changed}) == 3 and len(calls) == 3
+
+    with pytest.raises(TypeError):
+        cache.save('dict', {'not': 'an array'})
@@ -0,0 +1,83 @@
+# coding=utf-8
+
+import numpy as np
+import pytest
+
+from FBTP import fbtp
+
+from conftest import ABI_NAME_ID, CRITERIA, random_goalkeepers
+
+BACK = ['CB', 'LB', 'RB']
+FORWARD = ['CF', 'SS', 'LWF', 'RWF', 'AMF', 'CMF', 'DMF']
+
+
+def test_prune_state_follows_the_replacements(network):
+    gks = random_goalkeepers(3)
+    back, forward = network(30, BACK, seed=1), network(40, FORWARD, seed=2)
+    team = {"GK": [gks[0].get_id()], "Back": [0, 1, 2, 3], "Forward": [0, 1, 2, 3, 4, 5]}
+    state = fbtp.PruneState(team, gks, back, forward, CRITERIA, CRITERIA, ABI_NAME_ID)
+
+    state.replace("Back", 2, 20)
+    state.replace("Forward", 0, 30)
+    state.replace("Forward", 30, 31)
+    state.replace("GK", gks[0].get_id(), gks[2].get_id())
+
+    expected = fbtp.PruneState(state.team, gks, back, forward, CRITERIA, CRITERIA, ABI_NAME_ID)
+    assert state.team == {"GK": [gks[2].get_id()], "Back": [0, 1, 20, 3], "Forward": [31, 1, 2, 3, 4, 5]}
+    assert state.cost == pytest.approx(expected.cost)
+    assert state.ability() == pytest.approx(expected.ability())
+    assert state.player_cf == pytest.approx(expected.player_cf)
+    for pos in ("Back", "Forward"):
+        assert state.homo(pos) == pytest.approx(expected.homo(pos))
+
+
+def test_fbtp_rejects_an_unknown_pruning(network):
+    back, forward = network(30, BACK, seed=1), network(40, FORWARD, seed=2)
+    with pytest.raises(ValueError):
+        fbtp.FBTP(random_goalkeepers(3), ABI_NAME_ID,
+                  {i: i for i in range(30)}, back, CRITERIA, {i: i for i in range(40)}, forward, CRITERIA,
+                  50.0, 0.6, 0.2, 'PES', pruning="greedy")
+
+
+def test_sweep_matches_fbtp_for_each_budget(network):
+    gks = random_goalkeepers(3)
+    back, forward = network(30, BACK, seed=1), network(40, FORWARD, seed=2)
+    args = (gks, ABI_NAME_ID, {i: 100 + i for i in range(30)}, back, CRITERIA,
+            {i: 200 + i for i in range(40)}, forward, CRITERIA)
+
+    teams, frontier = fbtp.FBTP_sweep(*args, [1e9], 0.6, 0.2, 'PES', seed=0)
+    cost = teams[1e9]['cost']  # the unconstrained team
+    budgets = [cost * 0.9, cost * 0.7, cost * 0.5]
+    teams, frontier = fbtp.FBTP_sweep(*args, budgets, 0.6, 0.2, 'PES', seed=0)
+
+    assert any(teams[budget] is not None for budget in budgets)
+    for budget in budgets:
+        if teams[budget] is not None:
+            assert teams[budget]['cost'] < budget
+            assert teams[budget]['team'] == fbtp.FBTP(*args, budget, 0.6, 0.2, 'PES', seed=0)
+
+    costs = [point['cost'] for point in frontier]
+    assert costs == sorted(costs)
+    assert fbtp.pareto_frontier(frontier) == frontier
+
+
+def test_knapsack_repair_stays_within_the_budget(network):
+    gks = random_goalkeepers(3)
+    back, forward = network(30, BACK, seed=1), network(40, FORWARD, seed=2)
+    team = {"GK": [max(gks, key=lambda gk: gk.get_salary()).get_id()],
+            "Back": np.argsort(-back.salary)[:4].tolist(), "Forward": np.argsort(-forward.salary)[:6].tolist()}
+    state = fbtp.PruneState(team, gks, back, forward, CRITERIA, CRITERIA, ABI_NAME_ID)
+    budget = state.cost * 0.6
+
+    assert fbtp.repair_knapsack(state, budget)
+    assert state.cost < budget
+    for pos, pg in (("Back", back), ("Forward", forward)):
+        assert len(set(state.team[pos])) == len(team[pos])
+        assert sorted(pg.position_code[state.team[pos]]) == sorted(pg.position_code[team[pos]])
+    expected = fbtp.PruneState(state.team, gks, back, forward, CRITERIA, CRITERIA, ABI_NAME_ID)
+    assert state.cost == pytest.approx(expected.cost)
+
+    # nothing fits: the team is left as it was
+    before = {pos: list(players) for pos, players in state.team.items()}
+    assert not fbtp.repair_knapsack(state, 1e-3)
+    assert state.team == before
@@ -0,0 +1,207 @@
+# coding=utf-8
+
+import itertools
+
+import numpy as np
+import pytest
+
+from FBTP import greedy, players
+
+from conftest import ABI_NAME_ID, CRITERIA
+
+BACK = ['CB', 'LB', 'RB']
+FORWARD = ['CF', 'SS', 'LWF', 'RWF', 'AMF', 'CMF', 'DMF']
+
+
+"""
+O guloso original de referência: a cada passo percorre de novo o time inteiro para montar os
+vizinhos com vaga, a densidade, a habilidade do time e o Gini (<cal_homogeneity_dict>).
+"""
+def reference_greedy(vertex_list, star, alpha, beta, network_name, datasource):
+    position_num = greedy.get_position_num(datasource)
+    team = [star]
+    greedy.update_position(position_num, vertex_list[star].position, datasource)
+    threshold = 4 if network_name == "Back" else 6
+
+    def ability(player):
+        return greedy.cal_player_ability(vertex_list[player].abilities, CRITERIA, ABI_NAME_ID)
+
+    while len(team) < threshold:
+        neighbor = sorted({key.id for player in team for key in vertex_list[player].connectedTo
+                           if key.id not in team and
+                           position_num.get(greedy.position_trans(key.position, datasource), 0) > 0})
+        if not neighbor:
+            break
+
+        density, team_ability, team_homo = {}, {}, {}
+        for ne in neighbor:
+            linked = [op for op in team if vertex_list[op] in vertex_list[ne].connectedTo]
+            density[ne] = sum(vertex_list[ne].get_weight(vertex_list[op]) for op in linked) / (len(team) + 1)
+            team_ability[ne] = ability(ne) + sum(ability(op) for op in linked)
+            gini = greedy.cal_homogeneity_dict(vertex_list, ne, team)
+            team_homo[ne] = 1/gini if network_name == "Back" else gini
+
+        ability_nor = greedy.normalize_min_max(team_ability)
+        homo_nor = greedy.normalize_min_max(team_homo)
+        score = {ne: alpha * ability_nor[ne] + beta * density[ne] + (1-alpha-beta) * homo_nor[ne] for ne in neighbor}
+        candidate = max(neighbor, key=lambda ne: score[ne])  # the first of the best, as np.argmax
+
+        team.append(candidate)
+        greedy.update_position(position_num, vertex_list[candidate].position, datasource)
+
+    return team
+
+
+@pytest.mark.parametrize('network_name, positions', [("Back", BACK), ("Forward", FORWARD)])
+@pytest.mark.parametrize('seed', range(3))
+def test_frontier_greedy_matches_reference(network, network_name, positions, seed):
+    graph = network(60, positions, density=0.1, seed=seed)
+    player_num_id = {i: 1000 + i for i in range(graph.numVertices)}
+
+    for star in range(0, graph.numVertices, 7):
+        team = greedy.select_opt_players(player_num_id, graph.vertexList, CRITERIA, ABI_NAME_ID, 0.6, 0.2,
+                                         star, network_name, 'PES', verbose=False)
+        assert team == reference_greedy(graph.vertexList, star, 0.6, 0.2, network_name, 'PES')
+
+
+# O melhor time por força bruta: todas as combinações que respeitam as cotas da rede.
+def brute_force(graph, network_name, datasource, alpha, beta, budget):
+    fitness = greedy.TeamFitness(graph, CRITERIA, ABI_NAME_ID, alpha, beta, network_name, budget=budget)
+    graph = greedy.position_groups(graph, datasource)
+    parts = [list(itertools.combinations(graph.group_members[code].tolist(), num))
+             for code, (_, num) in greedy.network_quota(network_name, datasource).items()]
+    teams = np.array([sum(part, ()) for part in itertools.product(*parts)])
+    team_fitness = fitness.evaluate(teams)
+    best = int(np.argmax(team_fitness))
+    return team_fitness[best], sorted(teams[best].tolist())
+
+
+@pytest.mark.parametrize('network_name, positions', [('Back', BACK), ('Forward', ['CF', 'LWF', 'RWF', 'CMF'])])
+@pytest.mark.parametrize('budget', [None, 25.0, 12.0])
+def test_exact_matches_brute_force(network, network_name, positions, budget):
+    graph = network(16, positions, seed=3)
+    player_no_id = {i: i for i in range(graph.numVertices)}
+    expected_fitness, expected_team = brute_force(graph, network_name, 'PES', 0.6, 0.2, budget)
+
+    opt_players, fitness, stats = greedy.player_opt_subgraph_exact(player_no_id, graph, CRITERIA, ABI_NAME_ID,
+                                                                   0.6, 0.2, network_name, 'PES', budget=budget)
+    assert stats['optimal']
+    if np.isfinite(expected_fitness):
+        assert fitness == pytest.approx(expected_fitness)
+        assert sorted(opt_players) == expected_team
+    else:  # no team within the budget
+        assert opt_players is None
+
+
+def test_exact_prunes_most_children_of_a_large_pool(network):
+    graph = network(240, BACK, density=0.1, seed=5)
+    player_no_id = {i: i for i in range(graph.numVertices)}
+    opt_players, fitness, stats = greedy.player_opt_subgraph_exact(player_no_id, graph, CRITERIA, ABI_NAME_ID,
+                                                                   0.6, 0.2, 'Back', 'PES', max_nodes=5000)
+    assert stats['optimal']
+    assert stats['bound_prune_rate'] > 0.9
+
+
+# Os laterais ganham cópias mais caras (mesma classe e habilidades), que nunca são necessárias.
+def test_exact_drops_dominated_players(network):
+    graph = network(16, BACK, seed=3)
+    rng = np.random.default_rng(3)
+    class_sim = np.triu(rng.random((5, 5)) * (rng.random((5, 5)) < 0.6))
+    player_class = rng.integers(0, 5, graph.numVertices)
+    position = graph.position_names[graph.position_code]
+    copies = np.flatnonzero(np.isin(position, ['LB', 'RB']))
+    graph = players.ClassGraph(class_sim + class_sim.T, np.concatenate([player_class, player_class[copies]]),
+                               np.concatenate([position, position[copies]]),
+                               np.concatenate([graph.salary, graph.salary[copies] + 1]),
+                               np.vstack([graph.abilities, graph.abilities[copies]]), graph.ability_ids)
+    player_no_id = {i: i for i in range(graph.numVertices)}
+    expected_fitness, _ = brute_force(graph, 'Back', 'PES', 0.6, 0.2, None)
+
+    opt_players, fitness, stats = greedy.player_opt_subgraph_exact(player_no_id, graph, CRITERIA, ABI_NAME_ID,
+                                                                   0.6, 0.2, 'Back', 'PES')
+    assert stats['optimal']
+    assert stats['dominated'] >= len(copies)
+    assert fitness == pytest.approx(expected_fitness)
+    assert max(opt_players) < 16
+
+
+def test_exact_rejects_a_network_without_a_quota_position(network):
+    graph = network(12, ['CB', 'RB'], seed=0)
+    with pytest.raises(ValueError):
+        greedy.player_opt_subgraph_exact({i: i for i in range(graph.numVertices)}, graph, CRITERIA, ABI_NAME_ID,
+                                         0.6, 0.2, 'Back', 'PES')
+
+
+def test_exact_ignores_infeasible_incumbent_and_stops_at_max_nodes(network):
+    graph = network(16, BACK, seed=3)
+    player_no_id = {i: i for i in range(graph.numVertices)}
+    graph = greedy.position_groups(graph, 'PES')
+    cbs = graph.group_members[0].tolist()
+    expected = greedy.player_opt_subgraph_exact(player_no_id, graph, CRITERIA, ABI_NAME_ID, 0.6, 0.2, 'Back', 'PES')
+
+    # four centre backs break the quotas, however high their fitness
+    opt_players, fitness, stats = greedy.player_opt_subgraph_exact(player_no_id, graph, CRITERIA, ABI_NAME_ID,
+                                                                   0.6, 0.2, 'Back', 'PES', incumbent=cbs[:4])
+    assert stats['optimal']
+    assert (sorted(opt_players), fitness) == (sorted(expected[0]), expected[1])
+
+    opt_players, fitness, stats = greedy.player_opt_subgraph_exact(player_no_id, graph, CRITERIA, ABI_NAME_ID,
+                                                                   0.6, 0.2, 'Back', 'PES', max_nodes=1)
+    assert not stats['optimal']
+    assert stats['nodes'] == 1
+
+
+def test_position_slots_follow_the_network_quotas(network):
+    slots, slot_pools = greedy.position_slots(network(20, BACK, seed=0), 'Back', 'PES')
+    assert slots == ['CB', 'CB', 'LB', 'RB']
+    assert slot_pools[0] is slot_pools[1]
+
+    slots, _ = greedy.position_slots(network(40, FORWARD, seed=0), 'Forward', 'PES')
+    assert slots == ['CF/SS', 'LWF', 'RWF', '*MF', '*MF', '*MF']
+
+
+# no LB at all, and a single CB for two slots
+@pytest.mark.parametrize('positions', [['CB', 'CB', 'RB', 'RB'], ['CB', 'LB', 'RB', 'RB', 'RB']])
+def test_position_slots_reject_infeasible_pools(network, positions):
+    graph = network(len(positions), BACK, seed=0)
+    graph.set_players(positions, graph.salary, graph.abilities, graph.ability_ids)
+    with pytest.raises(ValueError):
+        greedy.position_slots(graph, 'Back', 'PES')
+    with pytest.raises(ValueError):
+        greedy.player_opt_subgraph_pso({i: i for i in range(graph.numVertices)}, graph, CRITERIA, ABI_NAME_ID,
+                                       0.6, 0.2, 'Back', 'PES', max_iterations=1, discrete=True)
+
+
+def test_set_swarm_only_visits_feasible_teams(network):
+    graph = network(30, BACK, seed=4)
+    fitness = greedy.TeamFitness(graph, CRITERIA, ABI_NAME_ID, 0.6, 0.2, 'Back')
+    swarm = greedy.SetSwarm(fitness, 20, *greedy.position_slots(graph, 'Back', 'PES'), np.random.default_rng(0))
+    groups = greedy.position_groups(graph, 'PES')
+    for _ in range(10):
+        swarm.step()
+        for team in swarm.positions.tolist():
+            assert len(set(team)) == 4
+            assert sorted(groups.group_code[team].tolist()) == [0, 0, 1, 2]
+
+
+def test_beam_respects_the_quotas(network):
+    graph = network(40, BACK, density=0.2, seed=6)
+    groups = greedy.position_groups(graph, 'PES')
+    player_num_id = {i: i for i in range(graph.numVertices)}
+    for star in range(0, graph.numVertices, 5):
+        team = greedy.select_opt_players_beam(player_num_id, graph.vertexList, CRITERIA, ABI_NAME_ID, 0.6, 0.2,
+                                              star, 'Back', 'PES', beam_width=3, verbose=False)
+        assert team[0] == star
+        assert sorted(groups.group_code[team].tolist()) == [0, 0, 1, 2]
+
+
+def test_beam_stops_without_neighbors_and_rejects_stars_without_quota(network):
+    player_num_id = {i: i for i in range(8)}
+    isolated = network(8, BACK, density=0.0, seed=0)
+    assert greedy.select_opt_players_beam(player_num_id, isolated.vertexList, CRITERIA, ABI_NAME_ID, 0.6, 0.2,
+                                          0, 'Back', 'PES', verbose=False) is None
+
+    goalkeeper = network(8, ['GK'], seed=0)
+    with pytest.raises(ValueError):
+        greedy.select_opt_players_beam(player_num_id, goalkeeper.vertexList, CRITERIA, ABI_NAME_ID, 0.6, 0.2,
+                                       0, 'Back', 'PES', verbose=False)
@@ -0,0 +1,24 @@
+# coding=utf-8
+
+import numpy as np
+import pytest
+
+from FBTP import modules
+
+
+# Atributos [clube, nacionalidade] sorteados de vocabulários pequenos, para haver muitas ligações.
+def random_attributes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {i: [str(rng.choice(list('abcdefg'))), str(rng.choice(['X', 'Y', 'Z']))] for i in range(n)}
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_sparse_similarity_matches_dense(seed):
+    attributes = random_attributes(40, seed)
+    dense = modules.cal_similarity('Back', attributes)
+    sparse = modules.cal_similarity_sparse('Back', attributes)
+
+    # the dense loops stop before the last player
+    np.testing.assert_allclose(sparse.toarray()[:-1, :-1], dense[:-1, :-1])
+    assert (sparse.toarray() == sparse.toarray().T).all()
+    assert sparse.has_sorted_indices
@@ -0,0 +1,112 @@
+# coding=utf-8
+
+import numpy as np
+import pytest
+
+from FBTP import players, greedy, modules
+
+
+# O Gini de referência: a fórmula original de <cal_homogeneity>, sobre os dicionários de habilidades.
+def baseline_gini(graph, team):
+    return greedy.cal_homogeneity_dict(graph.vertexList, team[0], team[1:])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_team_stats_gini_matches_baseline(network, seed):
+    graph = network(40, ['CB', 'LB', 'RB'], seed=seed)
+    rng = np.random.default_rng(seed)
+    team = rng.choice(graph.numVertices, size=6, replace=False).tolist()
+
+    stats = players.TeamStats(graph, team)
+    assert stats.gini() == pytest.approx(baseline_gini(graph, team))
+
+    stats.remove(team[2])
+    assert stats.gini() == pytest.approx(baseline_gini(graph, team[:2] + team[3:]))
+
+    stats.swap(team[0], team[2])
+    assert stats.gini() == pytest.approx(baseline_gini(graph, team[1:]))
+
+
+def test_team_stats_batched_moves_match_baseline(network):
+    graph = network(40, ['CB', 'LB', 'RB'], seed=7)
+    team = [3, 11, 25, 30]
+    candidates = np.array([0, 1, 2, 39])
+    stats = players.TeamStats(graph, team)
+
+    expected_add = [baseline_gini(graph, team + [c]) for c in candidates.tolist()]
+    assert stats.gini_add(candidates) == pytest.approx(expected_add)
+
+    expected_swap = [baseline_gini(graph, [c] + team[1:]) for c in candidates.tolist()]
+    assert stats.gini_swap(team[0], candidates) == pytest.approx(expected_swap)
+
+
+def test_team_stats_gini_is_zero_without_abilities():
+    graph = players.ArrayGraph([0, 0, 0, 0], [], [], ['CB', 'LB', 'RB'], [1, 2, 3],
+                               [[0, 5], [0, 5], [0, 5]], [0, 1])
+    with np.errstate(all='raise'):
+        assert players.TeamStats(graph).gini() == 0.0
+        stats = players.TeamStats(graph, [0, 1])
+        assert stats.gini() == 0.0
+        assert stats.gini_add([2]).tolist() == [0.0]
+        assert stats.gini_swap(0, [2]).tolist() == [0.0]
+
+    no_abilities = players.ArrayGraph([0, 0], [], [], ['CB'], [1], np.zeros((1, 0)), [])
+    assert players.TeamStats(no_abilities, [0]).gini() == 0.0
+
+
+def test_array_graph_sorts_the_csr_indices():
+    graph = players.ArrayGraph([0, 2, 3, 4], [2, 1, 0, 0], [0.5, 0.25, 0.25, 0.5],
+                               ['CB', 'LB', 'RB'], [1, 2, 3], np.ones((3, 1)), [0])
+    assert graph.neighbors(0).tolist() == [1, 2]
+    assert graph.weight(0, 2) == 0.5
+    assert graph.pair_weights([0, 0, 1], [1, 2, 2]).tolist() == [0.25, 0.5, 0.0]
+
+    with pytest.raises(ValueError):
+        players.ArrayGraph([0, 2], [0, 0], [1, 1], ['CB'], [1], np.ones((1, 1)), [0])
+
+
+def test_as_array_graph_follows_the_changes_of_the_graph():
+    graph = players.Graph()
+    for key in range(3):
+        player = graph.add_vertex(key)
+        player.position, player.salary, player.abilities = 'CB', 1.0, {0: 50}
+    graph.add_edge(0, 1, 0.5)
+    assert players.as_array_graph(graph) is players.as_array_graph(graph)
+    assert players.as_array_graph(graph).weight(0, 2) == 0
+
+    graph.add_edge(0, 2, 0.75)
+    assert players.as_array_graph(graph).weight(0, 2) == 0.75
+
+    graph.vertexList[2].salary = 9.0
+    graph.changed()
+    assert players.as_array_graph(graph).salary[2] == 9.0
+
+
+def test_class_graph_matches_the_full_network():
+    rng = np.random.default_rng(0)
+    n = 40
+    attributes = {i: [str(rng.choice(list('abcde'))), str(rng.choice(['X', 'Y']))] for i in range(n)}
+    abis_name = {'a%d' % k: {i: float(v) for i, v in enumerate(rng.integers(40, 99, n))} for k in range(12)}
+    abi_name_id = {name: k for k, name in enumerate(abis_name)}
+    pos = {i: str(rng.choice(['CB', 'LB', 'RB'])) for i in range(n)}
+    rating = {i: int(v) for i, v in enumerate(rng.integers(60, 90, n))}
+    abi_avg = modules.cal_ability_avg(abis_name)
+
+    full = greedy.players_graph_construction_bulk(modules.cal_similarity_sparse('Back', attributes),
+                                                  abi_avg, abis_name, abi_name_id, pos, rating)
+    compressed = greedy.players_graph_construction_compressed('Back', attributes, abi_avg, abis_name,
+                                                              abi_name_id, pos, rating)
+
+    assert compressed.num_classes < n
+    np.testing.assert_array_equal(compressed.degree(), full.degree())
+    for player in range(n):
+        np.testing.assert_array_equal(compressed.neighbors(player), full.neighbors(player))
+    f, t = np.divmod(np.arange(n * n), n)
+    np.testing.assert_allclose(compressed.pair_weights(f, t), full.pair_weights(f, t))
+    for team in ([0, 1, 2, 3], [5, 17, 33]):
+        np.testing.assert_array_equal(compressed.team_neighbors(team), full.team_neighbors(team))
+
+    criteria = {name: 1 for name in abis_name}
+    teams = np.array([rng.permutation(n)[:4] for _ in range(10)])
+    np.testing.assert_allclose(greedy.TeamFitness(compressed, criteria, abi_name_id, 0.6, 0.2, 'Back')(teams),
+                               greedy.TeamFitness(full, criteria, abi_name_id, 0.6, 0.2, 'Back')(teams))